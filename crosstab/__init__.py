@@ -0,0 +1,14 @@
+# ===========================================
+# アンケートのクロス集計ライブラリ
+# ===========================================
+# fixed_column.py : 性別・年代×各質問のクロス集計（run_survey_crosstab）
+# column_order.py : 2つの列グループの選択肢の組み合わせ数の集計（run_column_order）
+#
+# どちらもColabのセルにそのまま貼り付けて実行できるほか、importしてライブラリとして、
+# または python -m crosstab としてコマンドラインから利用できます。
+# gspread・google.colab・google.auth はスプレッドシートを使う場合のみ読み込まれます。
+
+from .fixed_column import run_survey_crosstab, run_survey_crosstab_batch
+from .column_order import run_column_order
+
+__all__ = ['run_survey_crosstab', 'run_survey_crosstab_batch', 'run_column_order']
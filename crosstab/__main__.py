@@ -0,0 +1,86 @@
+# ===========================================
+# クロス集計のコマンドライン実行
+# ===========================================
+# 使い方:
+#   python -m crosstab fixed <スプレッドシートURLまたはCSV・Parquet・XLSXのパス> --sheet-name シート名 \
+#       --categorical --output-path 結果.csv
+#   python -m crosstab batch manifest.csv --max-workers 4 --summary-path summary.csv
+#   python -m crosstab order <スプレッドシートURL> --sheet-name シート名 --pair A C D F --pair A C G H
+#   python -m crosstab order --input-path survey.csv --pair A C D F --output-path 結果.csv
+#
+# fixed・order のオプションは run_survey_crosstab・run_column_order の引数から作成します
+# （例: cache_dir → --cache-dir、True/Falseの引数は --xxx / --no-xxx）。
+# スプレッドシートを使う場合、Colab以外ではアプリケーションのデフォルト認証情報で認証します。
+
+import argparse
+import inspect
+import sys
+
+from . import column_order, fixed_column
+
+def add_signature_options(parser, func, skip):
+    """関数の引数（既定値のあるもの）をコマンドラインのオプションとして追加する"""
+    for name, param in inspect.signature(func).parameters.items():
+        if name in skip or param.default is inspect.Parameter.empty:
+            continue
+        option = '--' + name.replace('_', '-')
+        if isinstance(param.default, bool):
+            parser.add_argument(option, action=argparse.BooleanOptionalAction, default=param.default)
+        elif isinstance(param.default, int):
+            parser.add_argument(option, type=int, default=param.default)
+        else:
+            parser.add_argument(option, default=param.default)
+
+def signature_options(args, func, skip):
+    """コマンドラインの値から関数に渡すキーワード引数を取り出す"""
+    return {name: getattr(args, name) for name, param in inspect.signature(func).parameters.items()
+            if name not in skip and param.default is not inspect.Parameter.empty}
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog='python -m crosstab', description='アンケートのクロス集計')
+    parser.add_argument('--api-user-quota', type=int, default=60,
+                        help='1ユーザーあたりの1分間のSheets APIリクエスト数の上限')
+    parser.add_argument('--api-project-quota', type=int, default=300,
+                        help='プロジェクト全体の1分間のSheets APIリクエスト数の上限')
+    commands = parser.add_subparsers(dest='command', required=True)
+
+    fixed_skip = {'spreadsheet_url', 'gc'}
+    fixed = commands.add_parser('fixed', help='性別・年代×各質問のクロス集計（fixed_column.py）')
+    fixed.add_argument('spreadsheet_url', help='スプレッドシートのURL、またはCSV・Parquet・XLSXファイルのパス')
+    fixed.add_argument('--sheet-name', default='', help='シート名（XLSXファイルの場合はワークシート名）')
+    add_signature_options(fixed, fixed_column.run_survey_crosstab, fixed_skip)
+
+    batch = commands.add_parser('batch', help='マニフェストの複数スプレッドシートをまとめて集計')
+    batch.add_argument('manifest', help='spreadsheet_url, sheet_name 列を持つマニフェストCSV')
+    add_signature_options(batch, fixed_column.run_survey_crosstab_batch, {'manifest'})
+
+    order_skip = {'spreadsheet_url', 'column_group_pairs', 'gc'}
+    order = commands.add_parser('order', help='2つの列グループの選択肢の組み合わせ数の集計（column_order.py）')
+    order.add_argument('spreadsheet_url', nargs='?', default='', help='スプレッドシートのURL')
+    order.add_argument('--pair', action='append', nargs=4, required=True,
+                       metavar=('GROUP1_START', 'GROUP1_END', 'GROUP2_START', 'GROUP2_END'),
+                       help='集計する列グループの組み合わせ（複数指定可）')
+    add_signature_options(order, column_order.run_column_order, order_skip)
+
+    args = parser.parse_args(argv)
+
+    # fixed・batch・order のどれでも同じクォータ（トークンバケット）を共有する
+    fixed_column.configure_api_scheduler(user_per_minute=args.api_user_quota, project_per_minute=args.api_project_quota)
+
+    if args.command == 'fixed':
+        options = signature_options(args, fixed_column.run_survey_crosstab, fixed_skip)
+        fixed_column.run_survey_crosstab(args.spreadsheet_url, args.sheet_name, **options)
+    elif args.command == 'batch':
+        options = signature_options(args, fixed_column.run_survey_crosstab_batch, {'manifest'})
+        summary = fixed_column.run_survey_crosstab_batch(args.manifest, **options)
+        return 1 if (summary['status'] != '成功').any() else 0
+    else:
+        if not args.spreadsheet_url and not args.input_path:
+            parser.error('order: スプレッドシートのURLか --input-path を指定してください')
+        options = signature_options(args, column_order.run_column_order, order_skip)
+        column_order.run_column_order(args.spreadsheet_url, column_group_pairs=[tuple(pair) for pair in args.pair],
+                                      **options)
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main())
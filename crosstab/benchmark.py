@@ -0,0 +1,387 @@
+# ===========================================
+# クロス集計スクリプトのベンチマーク（オフライン実行用）
+# ===========================================
+# 合成したアンケートデータをメモリ上の疑似ワークシートに載せ、
+# fixed_column.py と column_order.py の各処理段階の実行時間を計測します。
+# Googleスプレッドシートへの接続は不要です。
+#
+# 使い方:
+#   python crosstab/benchmark.py --respondents 50000 --single-questions 40 --multi-questions 10 \
+#       --output bench.json
+#
+# 結果はJSONで出力されるため、実行ごとの比較に利用できます。
+
+import argparse
+import contextlib
+import importlib
+import io
+import json
+import os
+import platform
+import re
+import statistics
+import sys
+import time
+
+import numpy as np
+import pandas as pd
+
+SCRIPT_DIR = os.path.dirname(os.path.abspath(__file__))
+
+# ===========================================
+# 合成アンケートデータの生成
+# ===========================================
+
+def generate_survey_values(respondents=10000, single_questions=20, multi_questions=5,
+                           choices=5, multi_columns=5, fa_share=0.1,
+                           genders=2, age_ranges=6, blank_rate=0.1, seed=0):
+    """fixed_column.py が想定する形式（1行目ヘッダー・2行目タイトル行）の全セル値を生成する"""
+    rng = np.random.default_rng(seed)
+
+    gender_labels = ['男性', '女性', 'その他', '回答しない'][:genders] + [f'性別{i}' for i in range(4, genders)]
+    age_labels = [f'{10 * (i + 1)}代' for i in range(age_ranges)]
+    choice_labels = [f'選択肢{i + 1}' for i in range(choices)]
+
+    header = ['id', 'gender', 'age_range']
+    titles = ['', '', '']
+    columns = [
+        [str(i + 1) for i in range(respondents)],
+        rng.choice(gender_labels, respondents).tolist(),
+        rng.choice(age_labels, respondents).tolist(),
+    ]
+
+    def with_blanks(values):
+        blank = rng.random(respondents) < blank_rate
+        return np.where(blank, '', values).tolist()
+
+    # 単一回答（一部をFA＝自由回答として生成）
+    n_fa = int(round(single_questions * fa_share))
+    q_num = 1
+    for i in range(single_questions):
+        header.append(f'q_{q_num}')
+        titles.append(f'質問{q_num}')
+        if i < n_fa:
+            columns.append(with_blanks(np.char.add('自由回答', rng.integers(0, respondents, respondents).astype(str))))
+        else:
+            columns.append(with_blanks(rng.choice(choice_labels, respondents)))
+        q_num += 1
+
+    # 複数回答（長い質問文の列 + 番号付きの選択肢列）
+    for _ in range(multi_questions):
+        header.append(f'q_{q_num}_質問文')
+        titles.append(f'複数回答の質問{q_num}')
+        columns.append(with_blanks(rng.choice(choice_labels, respondents)))
+        for j in range(1, multi_columns):
+            header.append(f'q_{q_num}_{j}')
+            titles.append('')
+            selected = rng.random(respondents) < 0.4
+            columns.append(np.where(selected, choice_labels[j % choices], '').tolist())
+        q_num += 1
+
+    return [header, titles] + [list(row) for row in zip(*columns)]
+
+# ===========================================
+# gspreadのメモリ上の代替
+# ===========================================
+
+def parse_a1(cell):
+    """A1形式のセル番地を (列番号, 行番号) に変換する（省略された部分はNone）"""
+    letters, digits = re.fullmatch(r'([A-Z]*)(\d*)', cell).groups()
+    col = 0
+    for letter in letters:
+        col = col * 26 + ord(letter) - ord('A') + 1
+    return col or None, int(digits) if digits else None
+
+class InMemoryWorksheet:
+    """gspreadのWorksheetのうち、集計スクリプトが使うメソッドだけを持つメモリ上の代替"""
+
+    def __init__(self, title, values=None, rows=1000, cols=26):
+        self.title = title
+        self.values = values or []
+        self.row_count = max(rows, len(self.values))
+        self.col_count = max([cols] + [len(row) for row in self.values])
+        self.api_calls = 0
+
+    def get_all_values(self):
+        self.api_calls += 1
+        return [list(row) for row in self.values]
+
+    def read_range(self, range_name):
+        """A1形式の範囲（"A1:C100"・"1:2"・"A:C"）の値を返す（実際のAPIと同様に末尾の空セル・空行は省略する）"""
+        start, end = (range_name.split(':') + [range_name])[:2]
+        start_col, start_row = parse_a1(start)
+        end_col, end_row = parse_a1(end)
+        rows = []
+        for row in self.values[(start_row or 1) - 1:end_row or len(self.values)]:
+            cells = list(row[(start_col or 1) - 1:end_col or len(row)])
+            while cells and cells[-1] == '':
+                cells.pop()
+            rows.append(cells)
+        while rows and not rows[-1]:
+            rows.pop()
+        return rows
+
+    def write_range(self, range_name, values):
+        """A1形式の範囲の左上のセルから値を書き込む（範囲の外の値は変更しない）"""
+        start_col, start_row = parse_a1((range_name or 'A1').split(':')[0])
+        start_col, start_row = (start_col or 1) - 1, (start_row or 1) - 1
+        if start_row + len(values) > self.row_count or start_col + max(map(len, values), default=0) > self.col_count:
+            raise ValueError(f"範囲 {range_name} がシートのサイズ（{self.row_count}行×{self.col_count}列）を超えています")
+        for i, row in enumerate(values):
+            while len(self.values) <= start_row + i:
+                self.values.append([])
+            cells = self.values[start_row + i]
+            cells.extend([''] * (start_col + len(row) - len(cells)))
+            cells[start_col:start_col + len(row)] = list(row)
+
+    def get_values(self, range_name=None, **kwargs):
+        self.api_calls += 1
+        rows = self.read_range(range_name or 'A:ZZZ')
+        # gspreadのget_valuesと同様に、行の長さを揃えて返す
+        n_cols = max([len(row) for row in rows] + [0])
+        return [row + [''] * (n_cols - len(row)) for row in rows]
+
+    def batch_get(self, ranges, **kwargs):
+        self.api_calls += 1
+        return [self.read_range(range_name) for range_name in ranges]
+
+    def update(self, values=None, range_name=None, **kwargs):
+        self.api_calls += 1
+        self.write_range(range_name, values)
+
+    def batch_update(self, data, **kwargs):
+        self.api_calls += 1
+        for item in data:
+            self.write_range(item['range'], item['values'])
+
+    def resize(self, rows=None, cols=None):
+        """シートの行数・列数を変更する（縮小した範囲の値は削除される）"""
+        self.api_calls += 1
+        if rows is not None:
+            self.row_count = int(rows)
+            del self.values[self.row_count:]
+        if cols is not None:
+            self.col_count = int(cols)
+            self.values = [row[:self.col_count] for row in self.values]
+
+class InMemoryWorkbook:
+    """gspreadのSpreadsheetのメモリ上の代替"""
+
+    def __init__(self, sheets):
+        self.id = 'benchmark'
+        self.lastUpdateTime = None
+        self.sheets = {sheet.title: sheet for sheet in sheets}
+
+    def worksheet(self, title):
+        if title not in self.sheets:
+            raise KeyError(title)
+        return self.sheets[title]
+
+    def add_worksheet(self, title, rows, cols, **kwargs):
+        self.sheets[title] = InMemoryWorksheet(title, rows=int(rows), cols=int(cols))
+        return self.sheets[title]
+
+    def del_worksheet(self, worksheet):
+        del self.sheets[worksheet.title]
+
+class InMemoryClient:
+    """gspread.authorize() が返すクライアントのメモリ上の代替"""
+
+    def __init__(self, workbook):
+        self.workbook = workbook
+
+    def open_by_key(self, key):
+        return self.workbook
+
+    def open_by_url(self, url):
+        return self.workbook
+
+# ===========================================
+# 集計スクリプトの読み込み
+# ===========================================
+
+def load_script_module(name):
+    """集計スクリプトを crosstab パッケージからimportし、その名前空間を返す（gspread・google.colab は読み込まれない）"""
+    # スクリプトとして直接実行された場合も、テストやCLIと同じ crosstab パッケージのモジュールを使う
+    package_dir = os.path.dirname(SCRIPT_DIR)
+    if package_dir not in sys.path:
+        sys.path.insert(0, package_dir)
+    return vars(importlib.import_module(f'crosstab.{name}'))
+
+def load_fixed_column():
+    """fixed_column.py の関数定義を読み込む"""
+    return load_script_module('fixed_column')
+
+def load_column_order():
+    """column_order.py の関数定義を読み込む"""
+    return load_script_module('column_order')
+
+# ===========================================
+# 計測
+# ===========================================
+
+def time_stage(timings, name, func, *args, **kwargs):
+    """処理を実行して所要時間を記録し、戻り値を返す（標準出力は抑制する）"""
+    with contextlib.redirect_stdout(io.StringIO()):
+        started = time.perf_counter()
+        result = func(*args, **kwargs)
+        timings.setdefault(name, []).append(time.perf_counter() - started)
+    return result
+
+def benchmark_fixed_column(values, repeat=3, categorical=True, cube_mode=True):
+    """fixed_column.py の各段階（読み込み・質問識別・プロファイル・集計・書き込み用変換）を計測する"""
+    fc = load_fixed_column()
+    timings = {}
+    sizes = {}
+
+    for _ in range(repeat):
+        source = InMemoryWorksheet('survey', values)
+        workbook = InMemoryWorkbook([source])
+
+        df, df_analysis, _ = time_stage(
+            timings, 'load', fc['load_survey_data'],
+            'https://docs.google.com/spreadsheets/d/benchmark/edit', 'survey', categorical=categorical,
+            gc=InMemoryClient(workbook)
+        )
+        single_answer, multiple_answer = time_stage(
+            timings, 'identify_question_columns', fc['identify_question_columns'], df_analysis
+        )
+        question_cols = single_answer + [col for cols in multiple_answer.values() for col in cols]
+        profiles = time_stage(
+            timings, 'profile_question_columns', fc['profile_question_columns'], df_analysis, question_cols
+        )
+
+        def tabulate_single():
+            tables = {}
+            for question in single_answer:
+                if cube_mode:
+                    tables.update({(question, label): table for label, table
+                                   in fc['process_single_answer_cube'](df_analysis, question, profiles[question]).items()})
+                else:
+                    profile = profiles[question]
+                    tables[(question, '性別×回答')] = fc['process_gender_crosstab'](df_analysis, question, profile)
+                    tables[(question, '年代×回答')] = fc['process_age_crosstab'](df_analysis, question, profile)
+                    tables[(question, '性別×年代×回答')] = fc['process_single_answer_crosstab'](df_analysis, question, profile)
+            return tables
+
+        def tabulate_multiple():
+            tables = {}
+            for question_group, question_cols in multiple_answer.items():
+                tables.update({(question_group, label): table for label, table
+                               in fc['process_multiple_answer_all'](df_analysis, question_group, question_cols, profiles).items()})
+            return tables
+
+        single_tables = time_stage(timings, 'tabulate_single', tabulate_single)
+        multiple_tables = time_stage(timings, 'tabulate_multiple', tabulate_multiple)
+
+        results = {f"{question} ({label})": table
+                   for (question, label), table in {**single_tables, **multiple_tables}.items()}
+        grid = time_stage(timings, 'serialize', fc['build_summary_values'], results)
+
+        sizes = {
+            'rows': len(df_analysis),
+            'single_questions': len(single_answer),
+            'multiple_questions': len(multiple_answer),
+            'tables': sum(1 for table in results.values() if not table.empty),
+            'output_cells': len(grid) * (len(grid[0]) if grid else 0),
+        }
+
+    return timings, sizes
+
+def benchmark_column_order(values, repeat=3, group_columns=10):
+    """column_order.py のユニーク選択肢の抽出とクロス集計を計測する"""
+    co = load_column_order()
+    df = pd.DataFrame(values[2:], columns=values[0])
+    question_cols = [i for i, col in enumerate(values[0]) if col.startswith('q_')]
+    half = min(group_columns, len(question_cols) // 2)
+    column_group1 = df.iloc[:, question_cols[:half]]
+    column_group2 = df.iloc[:, question_cols[half:2 * half]]
+
+    timings = {}
+    for _ in range(repeat):
+        def unique_choices():
+            return [co['get_unique_choices'](group) for group in (column_group1, column_group2)]
+
+        group1_unique, group2_unique = time_stage(timings, 'column_order_unique', unique_choices)
+        cross_tab = time_stage(
+            timings, 'column_order_cross_tab', co['build_cross_tab'],
+            column_group1, column_group2, group1_unique, group2_unique
+        )
+
+    return timings, {'column_order_table_cells': int(cross_tab.size)}
+
+def summarize_timings(timings):
+    """段階ごとの計測値を中央値・最小値・全計測値にまとめる"""
+    return {
+        name: {
+            'median_sec': round(statistics.median(values), 6),
+            'min_sec': round(min(values), 6),
+            'runs_sec': [round(value, 6) for value in values],
+        }
+        for name, values in timings.items()
+    }
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='クロス集計スクリプトのオフラインベンチマーク')
+    parser.add_argument('--respondents', type=int, default=10000, help='回答者数')
+    parser.add_argument('--single-questions', type=int, default=20, help='単一回答の質問数')
+    parser.add_argument('--multi-questions', type=int, default=5, help='複数回答の質問数')
+    parser.add_argument('--choices', type=int, default=5, help='1問あたりの選択肢数')
+    parser.add_argument('--multi-columns', type=int, default=5, help='複数回答1問あたりの列数')
+    parser.add_argument('--fa-share', type=float, default=0.1, help='単一回答のうちFA（自由回答）列の割合')
+    parser.add_argument('--genders', type=int, default=2, help='gender の種類数')
+    parser.add_argument('--age-ranges', type=int, default=6, help='age_range の種類数')
+    parser.add_argument('--repeat', type=int, default=3, help='各段階の計測回数')
+    parser.add_argument('--seed', type=int, default=0, help='乱数シード')
+    parser.add_argument('--no-categorical', action='store_true', help='カテゴリ型での読み込みを無効にする')
+    parser.add_argument('--no-cube', action='store_true', help='単一回答のキューブ集計を無効にする')
+    parser.add_argument('--output', default='', help='結果JSONの保存先（省略時は標準出力）')
+    args = parser.parse_args(argv)
+
+    params = {
+        'respondents': args.respondents,
+        'single_questions': args.single_questions,
+        'multi_questions': args.multi_questions,
+        'choices': args.choices,
+        'multi_columns': args.multi_columns,
+        'fa_share': args.fa_share,
+        'genders': args.genders,
+        'age_ranges': args.age_ranges,
+        'seed': args.seed,
+        'categorical': not args.no_categorical,
+        'cube_mode': not args.no_cube,
+    }
+
+    started = time.perf_counter()
+    values = generate_survey_values(**{key: value for key, value in params.items()
+                                       if key not in ('categorical', 'cube_mode')})
+    generate_sec = time.perf_counter() - started
+
+    fixed_timings, fixed_sizes = benchmark_fixed_column(
+        values, repeat=args.repeat, categorical=params['categorical'], cube_mode=params['cube_mode']
+    )
+    order_timings, order_sizes = benchmark_column_order(values, repeat=args.repeat)
+
+    report = {
+        'params': params,
+        'environment': {
+            'python': platform.python_version(),
+            'pandas': pd.__version__,
+            'numpy': np.__version__,
+            'platform': platform.platform(),
+        },
+        'generate_sec': round(generate_sec, 6),
+        'stages': summarize_timings({**fixed_timings, **order_timings}),
+        'sizes': {**fixed_sizes, **order_sizes},
+    }
+
+    output = json.dumps(report, ensure_ascii=False, indent=2)
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            f.write(output + '\n')
+    else:
+        print(output)
+    return report
+
+if __name__ == '__main__':
+    main()
@@ -1,24 +1,35 @@
 # !pip install gspread pandas google-auth
 
-import gspread
-from google.colab import auth
-from google.auth import default
+# gspread・google.colab・google.auth はスプレッドシートを使う場合のみ関数内で読み込む
+import numpy as np
 import pandas as pd
+import os
 
-# Google Colabで認証を行う
-auth.authenticate_user()
-creds, _ = default()
-
-# gspreadクライアントを作成
-gc = gspread.authorize(creds)
+# Sheets APIの呼び出し・認証・シート取得のキャッシュ・ファイルの読み書きは fixed_column.py と共通のものを使う
+# （同じプロセスで両方を実行してもクォータを共有する。Colabでは fixed_column.py を同じフォルダに置く）
+try:
+    from .fixed_column import (authenticate_google, call_api, configure_api_scheduler, get_all_values_cached,
+                               get_api_scheduler, iter_file_rows, write_values_file)
+except ImportError:
+    from fixed_column import (authenticate_google, call_api, configure_api_scheduler, get_all_values_cached,
+                              get_api_scheduler, iter_file_rows, write_values_file)
 
 # 必要なパラメータ
 spreadsheet_url = ''  # スプレッドシートのURL
-sheet_name = ''  # 使用するシート名
+sheet_name = ''  # 使用するシート名（XLSXファイルの場合はワークシート名）
+input_path = ''   # 指定するとスプレッドシートの代わりにCSV・Parquet・XLSXファイルから読み込む
+output_path = ''  # 指定すると新しいシートの代わりにCSV・Parquet・XLSXファイルに書き出す
 column_group1_start = ''  # 最初の列グループの開始列
 column_group1_end = ''    # 最初の列グループの終了列
 column_group2_start = ''  # 二番目の列グループの開始列
 column_group2_end = ''    # 二番目の列グループの終了列
+column_group_pairs = []   # 複数の組み合わせをまとめて集計する場合は [('A', 'C', 'D', 'F'), ...] のように指定（空の場合は上の1組のみ）
+sparse_threshold = 200    # 選択肢数がこれを超える場合は疎行列で集計
+snapshot_cache_dir = '/content/sheet_cache'  # シート取得結果のキャッシュ保存先（空文字でキャッシュ無効）
+refresh_cache = False     # True にするとキャッシュを使わずシートを再取得する
+projected_fetch = True    # True にするとシート全体ではなく集計に使う列範囲だけを取得する
+api_user_quota_per_minute = 60      # 1ユーザーあたりの1分間のSheets APIリクエスト数の上限（読み取り・書き込みそれぞれ）
+api_project_quota_per_minute = 300  # プロジェクト全体の1分間のSheets APIリクエスト数の上限（読み取り・書き込みそれぞれ）
 
 # 列名をインデックスに変換する関数
 def col2num(col):
@@ -28,62 +39,207 @@ def col2num(col):
             num = num * 26 + (ord(c) - ord('A')) + 1
     return num
 
-# スプレッドシートを開く
-spreadsheet = gc.open_by_url(spreadsheet_url)
-worksheet = spreadsheet.worksheet(sheet_name)
-
-# データを取得
-data = worksheet.get_all_values()
-
-# データをDataFrameに変換
-df = pd.DataFrame(data[1:], columns=data[0])
-
-# グループの列インデックスを取得
-group1_start_idx = col2num(column_group1_start) - 1
-group1_end_idx = col2num(column_group1_end)
-group2_start_idx = col2num(column_group2_start) - 1
-group2_end_idx = col2num(column_group2_end)
-
-# グループの列を選択
-column_group1 = df.iloc[:, group1_start_idx:group1_end_idx]
-column_group2 = df.iloc[:, group2_start_idx:group2_end_idx]
-
-# グループ1のすべての選択肢をフラット化
-group1_flat = column_group1.values.flatten()
-# グループ2のすべての選択肢をフラット化
-group2_flat = column_group2.values.flatten()
-
-# ユニークな選択肢を取得し、ソート
-group1_unique = sorted(pd.Series(group1_flat).dropna().unique(), key=lambda x: (x != 'その他', x))
-group2_unique = sorted(pd.Series(group2_flat).dropna().unique(), key=lambda x: (x != 'その他', x))
-
-# クロス集計用のDataFrameを初期化
-cross_tab = pd.DataFrame(0, index=group1_unique, columns=group2_unique)
-
-# クロス集計を行う
-for i in range(len(df)):
-    group1_items = column_group1.iloc[i].dropna()
-    group2_items = column_group2.iloc[i].dropna()
-    for item1 in group1_items:
-        for item2 in group2_items:
-            cross_tab.at[item1, item2] += 1
-
-# 新しいシート名を作成
-new_sheet_name = f"{column_group1_start}_{column_group1_end}x{column_group2_start}_{column_group2_end}_cross_tab"
-
-# 新しいシートを追加してクロス集計結果を書き込む
-try:
-    new_worksheet = spreadsheet.add_worksheet(title=new_sheet_name, rows=str(cross_tab.shape[0] + 1), cols=str(cross_tab.shape[1] + 1))
-except gspread.exceptions.APIError:
-    print(f"シート名 '{new_sheet_name}' は既に存在します。別の名前を使用してください。")
-    new_worksheet = None
-
-if new_worksheet:
-    # ヘッダー行を設定
+# 列範囲をまとめる関数
+def merge_column_ranges(bounds):
+    """重なる・隣接する列範囲（1始まりの列番号の組）を結合し、昇順のリストで返す"""
+    merged = []
+    for start, end in sorted((min(bound), max(bound)) for bound in bounds):
+        if merged and start <= merged[-1][1] + 1:
+            merged[-1] = (merged[-1][0], max(merged[-1][1], end))
+        else:
+            merged.append((start, end))
+    return merged
+
+# 列グループを選択肢ごとの出現回数行列にエンコードする関数
+def encode_column_group(column_group, categories, sparse=False):
+    """各行×選択肢の出現回数行列を返す（欠損値は除外、同じ選択肢の重複はその回数分数える）"""
+    n_rows, n_cols = column_group.shape
+    codes = pd.Categorical(column_group.values.ravel(), categories=categories).codes
+    row_idx = np.repeat(np.arange(n_rows), n_cols)
+    valid = codes >= 0
+    row_idx, codes = row_idx[valid], codes[valid]
+
+    if sparse:
+        from scipy import sparse as sp
+        return sp.csr_matrix(
+            (np.ones(len(codes), dtype=np.int64), (row_idx, codes)),
+            shape=(n_rows, len(categories))
+        )
+
+    encoded = np.zeros((n_rows, len(categories)), dtype=np.int64)
+    np.add.at(encoded, (row_idx, codes), 1)
+    return encoded
+
+# エンコード済みの2つの列グループからクロス集計表を作成する関数
+def cross_tab_from_encoded(encoded1, encoded2, group1_unique, group2_unique):
+    """どちらかが疎行列の場合は両方を疎行列にそろえて行列積を計算する"""
+    if hasattr(encoded1, 'toarray') or hasattr(encoded2, 'toarray'):
+        from scipy import sparse as sp
+        counts = (sp.csr_matrix(encoded1).T @ sp.csr_matrix(encoded2)).toarray()
+    else:
+        counts = encoded1.T @ encoded2
+
+    return pd.DataFrame(np.asarray(counts, dtype=np.int64), index=group1_unique, columns=group2_unique)
+
+# 2つの列グループのクロス集計表を行列積で作成する関数
+def build_cross_tab(column_group1, column_group2, group1_unique, group2_unique):
+    """行ごとの選択肢の組み合わせ数を1回の行列積で集計する"""
+    sparse = max(len(group1_unique), len(group2_unique)) > sparse_threshold
+    encoded1 = encode_column_group(column_group1, group1_unique, sparse=sparse)
+    encoded2 = encode_column_group(column_group2, group2_unique, sparse=sparse)
+    return cross_tab_from_encoded(encoded1, encoded2, group1_unique, group2_unique)
+
+# 列グループのユニークな選択肢を取得する関数
+def get_unique_choices(column_group):
+    """すべての選択肢をフラット化し、「その他」を先頭にしてソートする"""
+    flat = column_group.values.flatten()
+    return sorted(pd.Series(flat).dropna().unique(), key=lambda x: (x != 'その他', x))
+
+# 列グループの選択肢とエンコード結果を取得する関数
+def get_encoded_group(df, start_col, end_col, encoded_groups):
+    """同じ列範囲は1回だけエンコードし、encoded_groups に保存して使い回す"""
+    key = (col2num(start_col), col2num(end_col))
+    if key not in encoded_groups:
+        # 列は元のシートの列番号で持っているため、列番号の範囲で選択する
+        column_group = df.loc[:, key[0]:key[1]]
+        unique = get_unique_choices(column_group)
+        encoded = encode_column_group(column_group, unique, sparse=len(unique) > sparse_threshold)
+        encoded_groups[key] = (unique, encoded)
+    return encoded_groups[key]
+
+# クロス集計表をシートに書き込む値に変換する関数
+def cross_tab_values(cross_tab):
+    """1行目に選択肢、1列目に選択肢を並べた行リストを返す"""
     header = [""] + cross_tab.columns.tolist()
     rows = cross_tab.reset_index().values.tolist()
-    new_worksheet.update([header] + rows)
-
-    print(f"クロス集計結果は新しいシート '{new_sheet_name}' に保存されました。")
-else:
-    print("クロス集計結果の保存に失敗しました。")
+    return [header] + rows
+
+# 複数のクロス集計表をまとめて新しいシートに書き込む関数
+def write_cross_tab_sheets(spreadsheet, cross_tabs):
+    """シートの追加と値の書き込みを、それぞれ1回のAPI呼び出しでまとめて行う"""
+    import gspread
+
+    existing_titles = {ws.title for ws in call_api('worksheets', spreadsheet.worksheets)}
+    new_tabs = {}
+    for sheet_title, cross_tab in cross_tabs.items():
+        if sheet_title in existing_titles:
+            print(f"シート名 '{sheet_title}' は既に存在します。別の名前を使用してください。")
+        else:
+            new_tabs[sheet_title] = cross_tab
+
+    if not new_tabs:
+        print("クロス集計結果の保存に失敗しました。")
+        return
+
+    try:
+        # 全シートを1回のリクエストで追加
+        call_api('batch_update', spreadsheet.batch_update, {'requests': [
+            {'addSheet': {'properties': {
+                'title': sheet_title,
+                'gridProperties': {'rowCount': cross_tab.shape[0] + 1, 'columnCount': cross_tab.shape[1] + 1},
+            }}}
+            for sheet_title, cross_tab in new_tabs.items()
+        ]})
+
+        # 全シートの値を1回のリクエストで書き込み
+        call_api('values_batch_update', spreadsheet.values_batch_update, {
+            'valueInputOption': 'RAW',
+            'data': [
+                {'range': "'{}'!A1".format(sheet_title.replace("'", "''")), 'values': cross_tab_values(cross_tab)}
+                for sheet_title, cross_tab in new_tabs.items()
+            ],
+        })
+    except gspread.exceptions.APIError as e:
+        print(f"クロス集計結果の保存に失敗しました: {e}")
+        return
+
+    for sheet_title in new_tabs:
+        print(f"クロス集計結果は新しいシート '{sheet_title}' に保存されました。")
+
+# CSV・Parquet・XLSXファイルの全データを読み込む関数
+def read_values_file(path, sheet_name=None, chunk_rows=10000):
+    """1行目をヘッダーとした文字列の行リストを、分割しながら読み込んで返す（行の列数はヘッダーに揃える）"""
+    data = [row for rows in iter_file_rows(path, sheet_name, chunk_rows=chunk_rows) for row in rows]
+    n_cols = len(data[0]) if data else 0
+    return [(list(row) + [''] * n_cols)[:n_cols] for row in data]
+
+# 列グループの組み合わせごとにクロス集計表を作成して保存する関数
+def run_column_order(spreadsheet_url='', sheet_name='', column_group_pairs=(), input_path='', output_path='',
+                     snapshot_cache_dir='', refresh_cache=False, projected_fetch=True, gc=None):
+    """(列グループ1の開始列, 終了列, 列グループ2の開始列, 終了列) の組み合わせごとのクロス集計表をシート名ごとに返す"""
+    # 集計に使う列範囲（重なる範囲は1つにまとめる）
+    column_ranges = merge_column_ranges(
+        [(col2num(start), col2num(end)) for pair in column_group_pairs for start, end in (pair[:2], pair[2:])]
+    )
+    column_numbers = None
+
+    # スプレッドシートを開く
+    if input_path:
+        # ローカルファイルから読み込む
+        spreadsheet = None
+        data = read_values_file(input_path, sheet_name)
+    else:
+        # gspreadクライアントを作成（渡された場合は認証済みのクライアントを使う）
+        if gc is None:
+            gc = authenticate_google()
+
+        spreadsheet = call_api('open_by_url', gc.open_by_url, spreadsheet_url)
+        worksheet = call_api('worksheet', spreadsheet.worksheet, sheet_name)
+
+        if projected_fetch:
+            # シートの列数を超える範囲は取得できないため、シートの範囲内に切り詰める
+            column_ranges = [(start, min(end, worksheet.col_count)) for start, end in column_ranges
+                             if start <= worksheet.col_count]
+            column_numbers = [num for start, end in column_ranges for num in range(start, end + 1)]
+
+        # データを取得（未更新のシートはキャッシュから読み込む）
+        data = get_all_values_cached(spreadsheet, worksheet, snapshot_cache_dir, refresh=refresh_cache,
+                                     column_ranges=column_ranges if projected_fetch else None)
+
+    # データをDataFrameに変換（列名は元のシートの列番号にする）
+    df = pd.DataFrame(data[1:], columns=column_numbers or range(1, len(data[0]) + 1))
+
+    # 列グループごとに選択肢の取得とエンコードを1回だけ行い、組み合わせ間で使い回す
+    encoded_groups = {}
+    cross_tabs = {}
+    for group1_start, group1_end, group2_start, group2_end in column_group_pairs:
+        group1_unique, encoded1 = get_encoded_group(df, group1_start, group1_end, encoded_groups)
+        group2_unique, encoded2 = get_encoded_group(df, group2_start, group2_end, encoded_groups)
+
+        # クロス集計を行い、新しいシート名を作成
+        new_sheet_name = f"{group1_start}_{group1_end}x{group2_start}_{group2_end}_cross_tab"
+        cross_tabs[new_sheet_name] = cross_tab_from_encoded(encoded1, encoded2, group1_unique, group2_unique)
+
+    if output_path or spreadsheet is None:
+        # ファイルに書き出す（出力先の指定がない場合は入力ファイルと同じ場所にCSVで保存する）
+        # 複数の組み合わせがある場合はシート名をファイル名に付けて組み合わせごとに保存する
+        output_base, output_ext = os.path.splitext(output_path or f"{os.path.splitext(input_path)[0]}.csv")
+        for new_sheet_name, cross_tab in cross_tabs.items():
+            if output_path and len(cross_tabs) == 1:
+                file_path = output_path
+            else:
+                file_path = f"{output_base}_{new_sheet_name}{output_ext}"
+            write_values_file(file_path, cross_tab_values(cross_tab), sheet_name=new_sheet_name[:31])
+    else:
+        # 新しいシートを追加してクロス集計結果をまとめて書き込む
+        write_cross_tab_sheets(spreadsheet, cross_tabs)
+
+    # Sheets APIの呼び出し回数・再試行回数・所要時間を表示
+    for method, stat in get_api_scheduler().stats.items():
+        print(f"  API呼び出し {method}: {stat['calls']}回（再試行{stat['retries']}回、{stat['seconds']:.2f}秒）")
+
+    return cross_tabs
+
+# 実行（Colabのセル・python column_order.py として実行した場合のみ。importした場合は実行しない）
+if __name__ == '__main__':
+    configure_api_scheduler(user_per_minute=api_user_quota_per_minute, project_per_minute=api_project_quota_per_minute)
+    run_column_order(
+        spreadsheet_url, sheet_name,
+        # 集計する列グループの組み合わせ（column_group_pairs が空の場合は上の1組のみ）
+        column_group_pairs or [(column_group1_start, column_group1_end, column_group2_start, column_group2_end)],
+        input_path=input_path,
+        output_path=output_path,
+        snapshot_cache_dir=snapshot_cache_dir,
+        refresh_cache=refresh_cache,
+        projected_fetch=projected_fetch
+    )
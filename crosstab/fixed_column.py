@@ -1,42 +1,672 @@
 # ===========================================
 # ライブラリインストール（初回実行時のみ）
 # ===========================================
-!pip install gspread pandas google-auth
+# !pip install gspread pandas google-auth
 
 # ===========================================
 # パラメータ設定（ここを編集してください）
 # ===========================================
-SPREADSHEET_URL = ""
-SHEET_NAME = ""
+SPREADSHEET_URL = ""  # スプレッドシートのURL、またはローカルのCSV・Parquet・XLSXファイルのパス
+SHEET_NAME = ""  # シート名（XLSXファイルの場合はワークシート名、CSV・Parquetの場合は不要）
+OUTPUT_PATH = ""  # 指定すると結果をCSV・Parquet・XLSXファイルに書き出す（スプレッドシートには保存しない）
+USE_CUBE_MODE = True  # 単一回答を性別×年代×回答のキューブで1回だけ集計する
+USE_CATEGORICAL_LOAD = True  # 読み込み時に gender・age_range・q_カラムをカテゴリ型に変換する
+PLANNED_LOAD = True  # ヘッダー・タイトル行を先に取得し、集計に必要な列（性別・年代・FAでないq_列）だけを取得する
+SNAPSHOT_CACHE_DIR = "/content/sheet_cache"  # シート取得結果のキャッシュ保存先（空文字でキャッシュ無効）
+REFRESH_CACHE = False  # True にするとキャッシュを使わずシートを再取得する
+READ_WINDOW_ROWS = 0  # 0より大きい場合はこの行数ずつ分割してシートを読み込む（巨大シート用）
+INCREMENTAL_STATE_DIR = ""  # 指定すると集計件数を保存し、次回以降は追加された行のみを集計する
+PARALLEL_WORKERS = 0  # 2以上の場合は質問ごとの集計を並列に実行する
+TABULATION_ENGINE = "pandas"  # "duckdb" にすると大規模なCSV・Parquetファイルを DuckDB で並列に集計する（pip install duckdb が必要）
+PARALLEL_BACKEND = "thread"  # 並列実行の方式（"thread" または "process"）
+QUIET_MODE = False  # True にすると質問・集計表ごとの進捗表示を省略する
+RUN_REPORT_PATH = ""  # 指定すると処理時間・件数・API呼び出し数の実行レポートをJSONで保存する
+FA_THRESHOLD = 20  # 単一回答の回答の種類数がこれを超える場合はFA（自由回答）として集計しない
+FA_SUMMARY_MODE = False  # True にするとFA判定した列の上位回答（表記ゆれを統一）を性別・年代別に集計する
+FA_SUMMARY_TOP_N = 10  # FA列の集計で表示する上位回答の数（残りは「その他」にまとめる）
+FA_SUMMARY_CAPACITY = 1000  # FA列の上位回答を数えるために保持する回答の種類数の上限（メモリ使用量の上限）
+SKIP_FA_COLUMNS = False  # True にするとFA判定した列を集計前に集計対象データから削除する
+UPDATE_IN_PLACE = False  # True にすると結果シートを作り直さず、変更のあった範囲のみを更新する
+API_USER_QUOTA_PER_MINUTE = 60  # 1ユーザーあたりの1分間のSheets APIリクエスト数の上限（読み取り・書き込みそれぞれ）
+API_PROJECT_QUOTA_PER_MINUTE = 300  # プロジェクト全体の1分間のSheets APIリクエスト数の上限（読み取り・書き込みそれぞれ）
+RESULT_CACHE_DIR = ""  # 指定すると質問ごとの集計表・書き込み用の値を保存し、回答が変わっていない質問は再集計しない
+RESULT_CACHE_MAX_MB = 500  # 集計結果キャッシュの上限サイズ（MB、超えた分は最後に使ってから長い順に削除）
+ALL_PAIRS_MODE = False  # True にすると全質問×全質問のクロス集計表も作成し、「質問間クロス集計」シートに保存する
+
+# 複数のスプレッドシートをまとめて処理する場合（MANIFEST_PATH を指定すると上の URL・シート名は使われません）
+# マニフェストは spreadsheet_url, sheet_name 列と、任意で run_survey_crosstab の引数名の列を持つCSV
+MANIFEST_PATH = ""
+BATCH_MAX_WORKERS = 4  # 同時に処理するスプレッドシート数
+BATCH_SUMMARY_PATH = "/content/crosstab_batch_summary.csv"  # 処理時間・失敗の一覧の保存先
 
 # ===========================================
 # 以下、関数定義（変更不要）
 # ===========================================
 
+import numpy as np
 import pandas as pd
-import gspread
-from google.auth import default
-from google.colab import auth
+# gspread・google.colab・google.auth はスプレッドシートを使う場合のみ関数内で読み込む
 import re
+import os
+import csv
+import json
+import time
+import random
+import heapq
+import hashlib
+import inspect
+import traceback
+import threading
+import functools
+import contextlib
+import unicodedata
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
 from collections import defaultdict
 
+# 実行中の集計の計測結果・静音モードの設定（バッチ処理ではスレッドごとに別の集計が走るためスレッドごとに保持する）
+_RUN_CONTEXT = threading.local()
+
+def is_quiet():
+    """実行中の集計が静音モード（質問・集計表ごとの進捗表示を省略する）かを返す"""
+    return getattr(_RUN_CONTEXT, 'quiet', False)
+
+def set_quiet(quiet):
+    """このスレッドで実行する集計の静音モードを設定する（並列集計のワーカーの初期化にも使う）"""
+    _RUN_CONTEXT.quiet = quiet
+
+def log_item(message):
+    """質問・集計表ごとの進捗を表示する（静音モードでは表示しない）"""
+    if not is_quiet():
+        print(message)
+
+class RunMetrics:
+    """1回の集計実行の段階ごとの処理時間・質問ごとの処理時間・API呼び出しを記録する"""
+
+    def __init__(self, spreadsheet_url, sheet_name):
+        self.spreadsheet_url = spreadsheet_url
+        self.sheet_name = sheet_name
+        self.started_at = time.time()
+        self.elapsed_sec = None
+        self.stages = {}
+        self.questions = []
+        self.counts = {}
+        self.api_calls = defaultdict(lambda: {'calls': 0, 'seconds': 0.0})
+        self.bytes_read = 0
+        self.bytes_written = 0
+
+    @contextlib.contextmanager
+    def stage(self, name):
+        """with文で囲んだ処理の時間を段階名ごとに加算する"""
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.stages[name] = self.stages.get(name, 0.0) + time.perf_counter() - started
+
+    def record_question(self, question, seconds, tables):
+        """質問1問分の処理時間と作成した集計表のサイズを記録する"""
+        self.questions.append({
+            'question': question,
+            'seconds': round(seconds, 6),
+            'tables': {label: list(table.shape) for label, table in tables.items()
+                       if table is not None and not table.empty},
+        })
+
+    def record_api_call(self, method, seconds=0.0, retries=0, wait_seconds=0.0):
+        self.api_calls[method]['calls'] += 1
+        self.api_calls[method]['seconds'] += seconds
+        if retries or wait_seconds:
+            self.api_calls[method]['retries'] = self.api_calls[method].get('retries', 0) + retries
+            self.api_calls[method]['wait_seconds'] = self.api_calls[method].get('wait_seconds', 0.0) + wait_seconds
+
+    def to_dict(self):
+        return {
+            'spreadsheet_url': self.spreadsheet_url,
+            'sheet_name': self.sheet_name,
+            'started_at': time.strftime('%Y-%m-%dT%H:%M:%S', time.localtime(self.started_at)),
+            'elapsed_sec': round(self.elapsed_sec if self.elapsed_sec is not None else time.time() - self.started_at, 6),
+            'stages_sec': {name: round(seconds, 6) for name, seconds in self.stages.items()},
+            'counts': self.counts,
+            'api_calls': {method: {key: round(v, 6) if isinstance(v, float) else v for key, v in value.items()}
+                          for method, value in self.api_calls.items()},
+            'bytes_read': self.bytes_read,
+            'bytes_written': self.bytes_written,
+            'questions': self.questions,
+        }
+
+    def save(self, path):
+        """実行レポートをJSONで保存する"""
+        with open(path, 'w', encoding='utf-8') as f:
+            json.dump(self.to_dict(), f, ensure_ascii=False, indent=2)
+        print(f"実行レポートを保存しました: {path}")
+
+def current_metrics():
+    """実行中の集計の計測結果を返す（計測していない場合はNone）"""
+    return getattr(_RUN_CONTEXT, 'metrics', None)
+
+def metrics_stage(name):
+    """計測中であれば段階の処理時間を記録するコンテキストを返す"""
+    metrics = current_metrics()
+    return metrics.stage(name) if metrics is not None else contextlib.nullcontext()
+
+class TokenBucket:
+    """1分あたりのリクエスト数の上限を守るトークンバケット（スレッド間で共有する）"""
+
+    def __init__(self, per_minute, clock=time.monotonic, sleep=time.sleep):
+        self.capacity = float(per_minute)
+        self.rate = per_minute / 60.0
+        self.tokens = self.capacity
+        self.clock = clock
+        self.sleep = sleep
+        self.updated = clock()
+        self.lock = threading.Lock()
+
+    def acquire(self):
+        """トークンを1つ取り出し、補充を待った秒数を返す"""
+        waited = 0.0
+        while True:
+            with self.lock:
+                now = self.clock()
+                self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+                self.updated = now
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return waited
+                wait = (1 - self.tokens) / self.rate
+            self.sleep(wait)
+            waited += wait
+
+class SheetsApiScheduler:
+    """全てのSheets API呼び出しの窓口（プロジェクト・ユーザーごとのレート制限、429・5xxの再試行、呼び出し数・所要時間の記録）"""
+
+    WRITE_METHODS = {'update', 'batch_update', 'values_batch_update', 'add_worksheet', 'del_worksheet',
+                     'resize', 'append_rows', 'clear'}
+
+    def __init__(self, user_per_minute=60, project_per_minute=300, max_retries=5, base_delay=1.0,
+                 clock=time.monotonic, sleep=time.sleep):
+        # Sheets APIのクォータは読み取り・書き込みごとに、プロジェクト単位とユーザー単位の両方がある
+        self.buckets = {
+            (scope, kind): TokenBucket(per_minute, clock=clock, sleep=sleep)
+            for scope, per_minute in (('project', project_per_minute), ('user', user_per_minute))
+            for kind in ('read', 'write')
+        }
+        self.max_retries = max_retries
+        self.base_delay = base_delay
+        self.sleep = sleep
+        self.stats = defaultdict(lambda: {'calls': 0, 'retries': 0, 'seconds': 0.0, 'wait_seconds': 0.0})
+        self.lock = threading.Lock()
+
+    def call(self, method, func, *args, **kwargs):
+        """レート制限の範囲内でAPIを呼び出し、クォータ超過（429）・サーバーエラー（5xx）は指数バックオフで再試行する"""
+        kind = 'write' if method in self.WRITE_METHODS else 'read'
+        retries = 0
+        wait_seconds = 0.0
+        started = time.perf_counter()
+        try:
+            for attempt in range(self.max_retries + 1):
+                wait_seconds += self.buckets[('project', kind)].acquire()
+                wait_seconds += self.buckets[('user', kind)].acquire()
+                try:
+                    return func(*args, **kwargs)
+                except Exception as e:
+                    # gspreadのAPIErrorはレスポンスのステータスコードで再試行するかを判定する
+                    status = get_api_error_status(e)
+                    if attempt == self.max_retries or not (status == 429 or (status is not None and status >= 500)):
+                        raise
+                    delay = self.base_delay * (2 ** attempt) + random.uniform(0, self.base_delay)
+                    print(f"  APIエラー（{status}）のため{delay:.1f}秒後に再試行します（{attempt + 1}/{self.max_retries}）")
+                    self.sleep(delay)
+                    retries += 1
+                    wait_seconds += delay
+        finally:
+            seconds = time.perf_counter() - started
+            with self.lock:
+                stat = self.stats[method]
+                stat['calls'] += 1
+                stat['retries'] += retries
+                stat['seconds'] += seconds
+                stat['wait_seconds'] += wait_seconds
+            metrics = current_metrics()
+            if metrics is not None:
+                metrics.record_api_call(method, seconds, retries=retries, wait_seconds=wait_seconds)
+
+def get_api_error_status(error):
+    """APIErrorからHTTPステータスコードを取り出す（取得できない場合はNone）"""
+    response = getattr(error, 'response', None)
+    status = getattr(response, 'status_code', None)
+    if status is None:
+        status = getattr(error, 'code', None)
+    return status if isinstance(status, int) else None
+
+# 全ての集計（バッチ処理の同時実行を含む）で共有するAPI呼び出しの窓口
+_API_SCHEDULER = SheetsApiScheduler()
+
+def configure_api_scheduler(user_per_minute=60, project_per_minute=300, max_retries=5, base_delay=1.0, **kwargs):
+    """API呼び出しのクォータ・再試行回数を設定し直す（テスト時は clock・sleep を差し替えられる）"""
+    global _API_SCHEDULER
+    _API_SCHEDULER = SheetsApiScheduler(user_per_minute, project_per_minute, max_retries, base_delay, **kwargs)
+    return _API_SCHEDULER
+
+def get_api_scheduler():
+    """現在のAPI呼び出しの窓口を返す（呼び出し数などの確認用）"""
+    return _API_SCHEDULER
+
+def call_api(method, func, *args, **kwargs):
+    """Sheets APIを共有のスケジューラー経由で呼び出す（レート制限・再試行・計測を行う）"""
+    return _API_SCHEDULER.call(method, func, *args, **kwargs)
+
+def record_transfer(bytes_read=0, bytes_written=0):
+    """計測中であれば送受信したデータ量（バイト）を加算する"""
+    metrics = current_metrics()
+    if metrics is not None:
+        metrics.bytes_read += bytes_read
+        metrics.bytes_written += bytes_written
+
+def estimate_values_bytes(values, sample_rows=100):
+    """セル値のリストのJSONサイズを一部の行から概算する"""
+    if not values:
+        return 0
+    step = max(1, len(values) // sample_rows)
+    sample = values[::step]
+    sample_bytes = len(json.dumps(sample, ensure_ascii=False).encode('utf-8'))
+    return int(sample_bytes * len(values) / len(sample))
+
 def authenticate_google():
-    """Google認証を行う"""
-    auth.authenticate_user()
-    creds, _ = default()
+    """Google認証を行う（Colab以外ではアプリケーションのデフォルト認証情報を使う）"""
+    import gspread
+    from google.auth import default
+    try:
+        from google.colab import auth
+    except ImportError:
+        creds, _ = default(scopes=['https://www.googleapis.com/auth/spreadsheets',
+                                   'https://www.googleapis.com/auth/drive'])
+    else:
+        auth.authenticate_user()
+        creds, _ = default()
     return gspread.authorize(creds)
 
-def load_survey_data(spreadsheet_url, sheet_name):
-    """スプレッドシートからアンケートデータを読み込む"""
-    gc = authenticate_google()
+def rowcol_to_a1(row, col):
+    """行番号・列番号（1始まり）をA1形式のセル番地に変換する（gspread.utils.rowcol_to_a1 と同じ）"""
+    letters = ''
+    while col > 0:
+        col, remainder = divmod(col - 1, 26)
+        letters = chr(ord('A') + remainder) + letters
+    return f"{letters}{row}"
+
+def get_sheet_revision(workbook):
+    """スプレッドシートの最終更新日時を取得する（取得できない場合はNone）"""
+    try:
+        if hasattr(workbook, 'get_lastUpdateTime'):
+            return call_api('get_lastUpdateTime', workbook.get_lastUpdateTime)
+        return call_api('lastUpdateTime', getattr, workbook, 'lastUpdateTime')
+    except Exception as e:
+        print(f"最終更新日時を取得できないためキャッシュを使用しません: {e}")
+        return None
+
+def get_all_values_cached(workbook, worksheet, cache_dir, refresh=False, column_ranges=None):
+    """シートの全データ（column_ranges指定時はその列範囲のみ）を取得する（未更新のシートはローカルのParquetキャッシュから読み込む）"""
+    def fetch():
+        if column_ranges:
+            return fetch_column_ranges(worksheet, column_ranges, 1, worksheet.row_count)
+        data = call_api('get_all_values', worksheet.get_all_values)
+        record_transfer(bytes_read=estimate_values_bytes(data))
+        return data
+
+    revision = get_sheet_revision(workbook) if cache_dir else None
+    if revision is None:
+        return fetch()
+
+    # スプレッドシートID・シート名（・列範囲）ごとのファイル名に更新日時のハッシュを付ける
+    sheet_id = f"{workbook.id}/{worksheet.title}" + (f"/{column_ranges}" if column_ranges else '')
+    sheet_key = hashlib.sha1(sheet_id.encode('utf-8')).hexdigest()[:16]
+    revision_key = hashlib.sha1(str(revision).encode('utf-8')).hexdigest()[:16]
+    cache_path = os.path.join(cache_dir, f"{sheet_key}_{revision_key}.parquet")
+
+    if not refresh and os.path.exists(cache_path):
+        print(f"キャッシュから読み込みます: {cache_path}")
+        return pd.read_parquet(cache_path).values.tolist()
+
+    data = fetch()
+    if not data:
+        return data
+
+    # 同じシートの古いキャッシュを削除してから保存
+    os.makedirs(cache_dir, exist_ok=True)
+    for name in os.listdir(cache_dir):
+        if name.startswith(f"{sheet_key}_"):
+            os.remove(os.path.join(cache_dir, name))
+
+    snapshot = pd.DataFrame(data, columns=[str(i) for i in range(len(data[0]))])
+    snapshot.to_parquet(cache_path, index=False)
+    print(f"シートのデータをキャッシュに保存しました: {cache_path}")
+
+    return data
+
+def encode_survey_columns(df):
+    """gender・age_range・q_カラムをカテゴリ型（整数コード）に変換する"""
+    for i, col in enumerate(df.columns):
+        if col in ('gender', 'age_range'):
+            # 性別・年代は空文字も集計軸の値として残す
+            df.isetitem(i, df.iloc[:, i].astype('category'))
+        elif col.startswith('q_'):
+            # 回答の空文字は欠損コード（-1）にする
+            values = df.iloc[:, i]
+            categories = sorted(v for v in values.dropna().unique() if v != '')
+            df.isetitem(i, pd.Categorical(values.where(values != ''), categories=categories))
+    return df
+
+def to_column_ranges(column_numbers):
+    """列番号（1始まり）のリストを、連続する列ごとの (開始列, 終了列) のリストにまとめる"""
+    ranges = []
+    for num in sorted(column_numbers):
+        if ranges and num == ranges[-1][1] + 1:
+            ranges[-1] = (ranges[-1][0], num)
+        else:
+            ranges.append((num, num))
+    return ranges
+
+def fetch_column_ranges(worksheet, column_ranges, start_row, end_row):
+    """指定した行範囲の複数の列範囲を1回のbatch_getで取得し、範囲を左から並べた行リストにまとめる"""
+    range_names = [f"{rowcol_to_a1(start_row, start)}:{rowcol_to_a1(end_row, end)}"
+                   for start, end in column_ranges]
+    responses = call_api('batch_get', worksheet.batch_get, range_names)
+    record_transfer(bytes_read=sum(estimate_values_bytes(values) for values in responses))
+
+    # 範囲ごとに末尾の空セル・空行が省略されるため、行数と列数を揃える
+    n_rows = max((len(values) for values in responses), default=0)
+    rows = [[] for _ in range(n_rows)]
+    for (start, end), values in zip(column_ranges, responses):
+        width = end - start + 1
+        for i in range(n_rows):
+            row = list(values[i]) if i < len(values) else []
+            rows[i].extend((row + [''] * width)[:width])
+    return rows
+
+def iter_sheet_windows(worksheet, n_cols, window_rows, start_row=3, column_ranges=None):
+    """シートを指定行数ずつ範囲指定（batch_get）で取得し、(開始行番号, 列数を揃えた行リスト) を順に返す（データのない範囲で終了する）"""
+    row = start_row
+    while row <= worksheet.row_count:
+        end_row = min(row + window_rows - 1, worksheet.row_count)
+        if column_ranges:
+            # 集計に必要な列範囲だけを取得
+            rows = fetch_column_ranges(worksheet, column_ranges, row, end_row)
+        else:
+            range_name = f"{rowcol_to_a1(row, 1)}:{rowcol_to_a1(end_row, n_cols)}"
+            values = call_api('batch_get', worksheet.batch_get, [range_name])[0]
+            record_transfer(bytes_read=estimate_values_bytes(values))
+
+            # 末尾の空セル・空行は返されないため空文字で列数を揃える
+            # （空行は回答がないため集計結果には影響しない）
+            rows = [list(r) + [''] * (n_cols - len(r)) for r in values]
+        if not rows:
+            # 末尾の空行は返されないため、空の範囲以降はデータがない（シートの空のグリッドを読み進めない）
+            break
+        yield row, rows
+
+        row = end_row + 1
+
+def combine_encoded_chunks(chunks):
+    """分割して読み込んだDataFrameを結合する（カテゴリ型はカテゴリを統合して維持する）"""
+    if not chunks:
+        return pd.DataFrame()
+
+    for i in range(chunks[0].shape[1]):
+        if isinstance(chunks[0].iloc[:, i].dtype, pd.CategoricalDtype):
+            categories = sorted(set().union(*(chunk.iloc[:, i].cat.categories for chunk in chunks)))
+            for chunk in chunks:
+                chunk.isetitem(i, chunk.iloc[:, i].cat.set_categories(categories))
+
+    return pd.concat(chunks, ignore_index=True)
+
+def load_title_frame(worksheet):
+    """1行目（ヘッダー）と2行目（タイトル行）のみを取得し、タイトル行1行のDataFrameを返す"""
+    header_rows = call_api('batch_get', worksheet.batch_get, ['1:2'])[0]
+    record_transfer(bytes_read=estimate_values_bytes(header_rows))
+    return build_title_frame(header_rows)
+
+def build_title_frame(header_rows):
+    """1行目（ヘッダー）と2行目（タイトル行）の値から、タイトル行1行のDataFrameを作成する"""
+    header = list(header_rows[0])
+    title_row = list(header_rows[1]) if len(header_rows) > 1 else []
+    title_row += [''] * (len(header) - len(title_row))
+    return pd.DataFrame([title_row[:len(header)]], columns=header)
+
+def load_survey_data_paged(worksheet, window_rows, categorical=False):
+    """巨大シートを行単位で分割取得し、取得ごとにDataFrameへ変換して追加する"""
+    # 1行目（ヘッダー）と2行目（タイトル行）を先に取得
+    df = load_title_frame(worksheet)
+    header = df.columns.tolist()
+
+    chunks = []
+    n_rows = 0
+    for _, rows in iter_sheet_windows(worksheet, len(header), window_rows):
+        chunk = pd.DataFrame(rows, columns=header)
+        if categorical:
+            chunk = encode_survey_columns(chunk)
+        chunks.append(chunk)
+        n_rows += len(rows)
+        log_item(f"  {n_rows}行を読み込みました")
+
+    if not chunks:
+        return df, pd.DataFrame(columns=header)
+
+    return df, combine_encoded_chunks(chunks)
+
+def plan_survey_columns(header, sample, fa_threshold=20, keep_fa_columns=False):
+    """ヘッダーと先頭の回答行のサンプルから、集計に必要な列番号（1始まり）とFA判定で除外する列を決める"""
+    single_answer, _ = identify_question_columns(pd.DataFrame(columns=header))
+
+    # サンプルだけで回答の種類数が閾値を超える単一回答の列は、全行でも必ずFA判定になるため取得しない
+    fa_columns = set()
+    if single_answer and sample and not keep_fa_columns:
+        positions = {col: header.index(col) for col in single_answer}
+        for col, i in positions.items():
+            answers = {row[i] for row in sample if i < len(row) and row[i] != ''}
+            if len(answers) > fa_threshold:
+                fa_columns.add(col)
+
+    column_numbers = [i for i, col in enumerate(header, 1)
+                      if (col in ('gender', 'age_range') or col.startswith('q_')) and col not in fa_columns]
+    return column_numbers, sorted(fa_columns)
+
+def load_survey_data_planned(workbook, worksheet, categorical=False, cache_dir=None, refresh_cache=False,
+                             window_rows=0, fa_threshold=20, sample_rows=200, keep_fa_columns=False):
+    """ヘッダー・タイトル行を先に取得して必要な列を決め、その列だけを読み込む"""
+    # 1行目（ヘッダー）・2行目（タイトル行）とFA判定用のサンプル行を1回のbatch_getでまとめて取得
+    header_rows, sample = call_api('batch_get', worksheet.batch_get, ['1:2', f"3:{2 + sample_rows}"])
+    record_transfer(bytes_read=estimate_values_bytes(header_rows) + estimate_values_bytes(sample))
+    df = build_title_frame(header_rows)
+    header = df.columns.tolist()
+
+    column_numbers, fa_columns = plan_survey_columns(header, sample, fa_threshold=fa_threshold,
+                                                   keep_fa_columns=keep_fa_columns)
+    columns = [header[i - 1] for i in column_numbers]
+    column_ranges = to_column_ranges(column_numbers)
+    print(f"集計に必要な{len(columns)}/{len(header)}列を取得します（FA判定で除外: {len(fa_columns)}列）")
+
+    metrics = current_metrics()
+    if metrics is not None:
+        metrics.counts['planned_fa_columns'] = len(fa_columns)
+
+    if not column_ranges:
+        return df, pd.DataFrame(columns=columns)
+
+    if window_rows > 0:
+        # 分割取得の場合はキャッシュを使わず、必要な列だけを行単位で取得する
+        chunks = []
+        n_rows = 0
+        for _, rows in iter_sheet_windows(worksheet, len(columns), window_rows, column_ranges=column_ranges):
+            chunk = pd.DataFrame(rows, columns=columns)
+            if categorical:
+                chunk = encode_survey_columns(chunk)
+            chunks.append(chunk)
+            n_rows += len(rows)
+            log_item(f"  {n_rows}行を読み込みました")
+        return df, combine_encoded_chunks(chunks) if chunks else pd.DataFrame(columns=columns)
+
+    # 1行目からの必要な列を取得（未更新のシートはキャッシュから読み込む）
+    data = get_all_values_cached(workbook, worksheet, cache_dir, refresh=refresh_cache, column_ranges=column_ranges)
+    df_for_analysis = pd.DataFrame(data[2:], columns=columns)
+    del data
+    if categorical:
+        df_for_analysis = encode_survey_columns(df_for_analysis)
+    return df, df_for_analysis
+
+def is_local_source(source):
+    """入力元がローカルファイルのパスかどうかを判定する（URLでなければファイルとして扱う）"""
+    return not source.startswith(('http://', 'https://'))
+
+def file_cell_to_str(value):
+    """ファイルから読み込んだセル値をスプレッドシートの表示値と同じ文字列に揃える"""
+    if value is None or (isinstance(value, float) and pd.isna(value)):
+        return ''
+    if isinstance(value, float) and value.is_integer():
+        return str(int(value))
+    return str(value)
+
+def iter_file_rows(path, sheet_name=None, chunk_rows=10000):
+    """CSV・Parquet・XLSXファイルを、文字列の行リストのまとまりとして先頭から順に読み込む"""
+    extension = os.path.splitext(path)[1].lower()
+
+    if extension == '.csv':
+        for chunk in pd.read_csv(path, header=None, dtype=str, keep_default_na=False,
+                                 chunksize=chunk_rows, encoding='utf-8-sig'):
+            yield chunk.values.tolist()
+
+    elif extension == '.parquet':
+        import pyarrow.parquet as pq
+        parquet_file = pq.ParquetFile(path)
+        # 列名を1行目（ヘッダー）として返す
+        yield [parquet_file.schema_arrow.names]
+        for batch in parquet_file.iter_batches(batch_size=chunk_rows):
+            yield [[file_cell_to_str(value) for value in row]
+                   for row in zip(*(column.to_pylist() for column in batch.columns))]
+
+    elif extension in ('.xlsx', '.xlsm'):
+        from openpyxl import load_workbook
+        workbook = load_workbook(path, read_only=True, data_only=True)
+        try:
+            worksheet = workbook[sheet_name] if sheet_name else workbook.active
+            rows = []
+            for row in worksheet.iter_rows(values_only=True):
+                rows.append([file_cell_to_str(value) for value in row])
+                if len(rows) >= chunk_rows:
+                    yield rows
+                    rows = []
+            if rows:
+                yield rows
+        finally:
+            workbook.close()
+
+    else:
+        raise ValueError(f"対応していないファイル形式です: {path}（CSV・Parquet・XLSXに対応）")
+
+def load_survey_file(path, sheet_name=None, categorical=False, chunk_rows=0):
+    """ローカルファイルからアンケートデータを分割して読み込む（1行目ヘッダー・2行目タイトル行）"""
+    header = None
+    df = None
+    chunks = []
+    n_rows = 0
+    for rows in iter_file_rows(path, sheet_name, chunk_rows=chunk_rows or 10000):
+        # 先頭のまとまりからヘッダーとタイトル行を取り出す
+        if header is None:
+            header, rows = rows[0], rows[1:]
+        if df is None and rows:
+            title_row, rows = rows[0], rows[1:]
+            df = pd.DataFrame([(list(title_row) + [''] * len(header))[:len(header)]], columns=header)
+        if not rows:
+            continue
+
+        chunk = pd.DataFrame([(list(row) + [''] * len(header))[:len(header)] for row in rows], columns=header)
+        if categorical:
+            chunk = encode_survey_columns(chunk)
+        chunks.append(chunk)
+        n_rows += len(rows)
+        log_item(f"  {n_rows}行を読み込みました")
+
+    if header is None:
+        raise ValueError(f"ファイルにデータがありません: {path}")
+    if df is None:
+        df = pd.DataFrame([[''] * len(header)], columns=header)
+
+    return df, combine_encoded_chunks(chunks) if chunks else pd.DataFrame(columns=header)
+
+def write_values_file(path, values, sheet_name="クロス集計結果"):
+    """書き込み用の値をCSV・Parquet・XLSXファイルに書き出す"""
+    extension = os.path.splitext(path)[1].lower()
+
+    if extension == '.csv':
+        # Excelで文字化けしないようBOM付きUTF-8で1行ずつ書き出す
+        with open(path, 'w', newline='', encoding='utf-8-sig') as f:
+            csv.writer(f).writerows(values)
+
+    elif extension == '.parquet':
+        # 列ごとに型が混在するため、全セルを文字列にして列番号を列名として保存する
+        n_cols = max((len(row) for row in values), default=0)
+        grid = pd.DataFrame([[str(cell) for cell in row] for row in values],
+                            columns=[str(i) for i in range(n_cols)])
+        grid.to_parquet(path, index=False)
+
+    elif extension in ('.xlsx', '.xlsm'):
+        from openpyxl import Workbook
+        workbook = Workbook(write_only=True)
+        worksheet = workbook.create_sheet(title=sheet_name)
+        for row in values:
+            worksheet.append(row)
+        workbook.save(path)
+
+    else:
+        raise ValueError(f"対応していないファイル形式です: {path}（CSV・Parquet・XLSXに対応）")
+
+    record_transfer(bytes_written=os.path.getsize(path))
+    print(f"結果をファイルに保存しました: {path}")
+
+def open_survey_worksheet(spreadsheet_url, sheet_name, gc=None):
+    """スプレッドシートと対象シートを開く（gcを渡した場合は認証済みクライアントを再利用する）"""
+    if gc is None:
+        gc = authenticate_google()
 
     # URLからスプレッドシートIDを抽出
     sheet_id = spreadsheet_url.split('/d/')[1].split('/')[0]
-    workbook = gc.open_by_key(sheet_id)
-    worksheet = workbook.worksheet(sheet_name)
+    workbook = call_api('open_by_key', gc.open_by_key, sheet_id)
+    worksheet = call_api('worksheet', workbook.worksheet, sheet_name)
+
+    return workbook, worksheet
+
+def load_survey_data(spreadsheet_url, sheet_name, categorical=False, cache_dir=None, refresh_cache=False,
+                     window_rows=0, gc=None, planned=False, fa_threshold=20, keep_fa_columns=False):
+    """スプレッドシートからアンケートデータを読み込む"""
+    workbook, worksheet = open_survey_worksheet(spreadsheet_url, sheet_name, gc=gc)
+
+    if planned:
+        # 必要な列だけを取得する場合は、2行目（タイトル行）のみのdfを返す
+        df, df_for_analysis = load_survey_data_planned(
+            workbook, worksheet,
+            categorical=categorical,
+            cache_dir=cache_dir,
+            refresh_cache=refresh_cache,
+            window_rows=window_rows,
+            fa_threshold=fa_threshold,
+            keep_fa_columns=keep_fa_columns
+        )
+        return df, df_for_analysis, workbook
+
+    if window_rows > 0:
+        # 分割取得の場合はキャッシュを使わず、2行目（タイトル行）のみのdfを返す
+        df, df_for_analysis = load_survey_data_paged(worksheet, window_rows, categorical=categorical)
+        return df, df_for_analysis, workbook
 
     # データを取得してDataFrameに変換
-    data = worksheet.get_all_values()
+    data = get_all_values_cached(workbook, worksheet, cache_dir, refresh=refresh_cache)
+
+    if categorical:
+        # 2行目（タイトル行）だけを別に保持し、集計対象は3行目以降から直接作成する
+        df = pd.DataFrame(data[1:2], columns=data[0])
+        df_for_analysis = encode_survey_columns(pd.DataFrame(data[2:], columns=data[0]))
+        del data
+        return df, df_for_analysis, workbook
+
     df = pd.DataFrame(data[1:], columns=data[0])  # 1行目をヘッダーとして使用
 
     # 3行目以降を集計対象とする（2行目はタイトル行のため除外）
@@ -90,20 +720,59 @@ def get_question_title(df, question_col):
                 return f"{question_col}_{title_row[question_col]}"
     return question_col
 
-def process_single_answer_crosstab(df, question_col):
-    """単一回答のクロス集計を処理"""
-    # 空でない回答のみを対象
-    valid_responses = df[df[question_col].notna() & (df[question_col] != '')]
-
-    if len(valid_responses) == 0:
-        return pd.DataFrame()
-
-    # 回答の種類数をカウント
-    unique_answers = valid_responses[question_col].nunique()
+def get_multiple_question_title(df, question_group, question_cols):
+    """複数回答の質問タイトルを取得（長い質問文を優先的に選択）"""
+    if not question_cols:
+        return question_group
 
-    # 回答数が20を超える場合はFA判定でスキップ
-    if unique_answers > 20:
-        print(f"  {question_col}: 回答数{unique_answers}個のためFA判定でスキップ")
+    # 長い質問文（数字でないもの）を探す
+    long_question_col = None
+    for col in question_cols:
+        parts = col.split('_')
+        if len(parts) >= 3 and not parts[2].isdigit():
+            long_question_col = col
+            break
+
+    # 長い質問文があればそれを使用、なければ最初の選択肢を使用
+    title_col = long_question_col if long_question_col else question_cols[0]
+    return get_question_title(df, title_col)
+
+def profile_question_column(values, fa_threshold=20):
+    """1列分の有効回答マスク・回答の種類（コード付き）・FA判定をまとめて求める"""
+    # 空文字・欠損を除いた回答をソート済みのコードに変換（無回答は-1）
+    codes, answers = pd.factorize(values.where(values != ''), sort=True)
+    return {
+        'valid': codes >= 0,
+        'codes': codes,
+        'answers': answers,
+        'unique_answers': len(answers),
+        'is_fa': len(answers) > fa_threshold,
+    }
+
+def profile_question_columns(df, columns, fa_threshold=20):
+    """質問カラムをまとめて1回だけ走査し、列ごとのプロファイルを返す"""
+    return {col: profile_question_column(df[col], fa_threshold) for col in columns}
+
+def select_valid_responses(df, question_col, profile=None, fa_threshold=20):
+    """空でない回答の行を返す（回答がない場合・FA判定の場合はNone）"""
+    if profile is None:
+        profile = profile_question_column(df[question_col], fa_threshold)
+
+    if not profile['valid'].any():
+        return None
+
+    # 回答の種類数が閾値を超える場合はFA判定でスキップ
+    if profile['is_fa']:
+        log_item(f"  {question_col}: 回答数{profile['unique_answers']}個のためFA判定でスキップ")
+        return None
+
+    return df[profile['valid']]
+
+def process_single_answer_crosstab(df, question_col, profile=None, fa_threshold=20):
+    """単一回答のクロス集計を処理"""
+    # 空でない回答のみを対象（回答がない場合・FA判定の場合はスキップ）
+    valid_responses = select_valid_responses(df, question_col, profile, fa_threshold)
+    if valid_responses is None:
         return pd.DataFrame()
 
     # クロス集計
@@ -118,20 +787,11 @@ def process_single_answer_crosstab(df, question_col):
 
     return crosstab
 
-def process_gender_crosstab(df, question_col):
+def process_gender_crosstab(df, question_col, profile=None, fa_threshold=20):
     """性別×回答のクロス集計を処理"""
-    # 空でない回答のみを対象
-    valid_responses = df[df[question_col].notna() & (df[question_col] != '')]
-
-    if len(valid_responses) == 0:
-        return pd.DataFrame()
-
-    # 回答の種類数をカウント
-    unique_answers = valid_responses[question_col].nunique()
-
-    # 回答数が20を超える場合はFA判定でスキップ
-    if unique_answers > 20:
-        print(f"  {question_col}: 回答数{unique_answers}個のためFA判定でスキップ")
+    # 空でない回答のみを対象（回答がない場合・FA判定の場合はスキップ）
+    valid_responses = select_valid_responses(df, question_col, profile, fa_threshold)
+    if valid_responses is None:
         return pd.DataFrame()
 
     # クロス集計（性別×回答）
@@ -143,20 +803,11 @@ def process_gender_crosstab(df, question_col):
 
     return crosstab
 
-def process_age_crosstab(df, question_col):
+def process_age_crosstab(df, question_col, profile=None, fa_threshold=20):
     """年代×回答のクロス集計を処理"""
-    # 空でない回答のみを対象
-    valid_responses = df[df[question_col].notna() & (df[question_col] != '')]
-
-    if len(valid_responses) == 0:
-        return pd.DataFrame()
-
-    # 回答の種類数をカウント
-    unique_answers = valid_responses[question_col].nunique()
-
-    # 回答数が20を超える場合はFA判定でスキップ
-    if unique_answers > 20:
-        print(f"  {question_col}: 回答数{unique_answers}個のためFA判定でスキップ")
+    # 空でない回答のみを対象（回答がない場合・FA判定の場合はスキップ）
+    valid_responses = select_valid_responses(df, question_col, profile, fa_threshold)
+    if valid_responses is None:
         return pd.DataFrame()
 
     # クロス集計（年代×回答）
@@ -168,195 +819,532 @@ def process_age_crosstab(df, question_col):
 
     return crosstab
 
-def process_multiple_answer_crosstab(df, question_group, question_cols):
-    """複数回答のクロス集計を処理"""
-    # カラムを適切な順序でソート
-    def sort_multiple_cols(cols):
-        def get_col_sort_key(col):
-            parts = col.split('_')
-            if len(parts) >= 3:
-                if parts[2].isdigit():
-                    return int(parts[2])  # q_3_1 -> 1
-                else:
-                    return 0  # q_3_長い質問文 -> 0
-            return 999
-        return sorted(cols, key=get_col_sort_key)
-
-    sorted_question_cols = sort_multiple_cols(question_cols)
-    results = []
-
-    for col in sorted_question_cols:
-        # 空でない回答のみを対象
-        valid_responses = df[df[col].notna() & (df[col] != '')]
-
-        if len(valid_responses) == 0:
-            continue
+def add_crosstab_margins(table):
+    """pd.crosstab(margins=True) と同じ形式で合計行・合計列（All）を追加する"""
+    table = table.copy()
+    table['All'] = table.sum(axis=1)
+    if isinstance(table.index, pd.MultiIndex):
+        total_key = ('All',) + ('',) * (table.index.nlevels - 1)
+    else:
+        total_key = 'All'
+    table.loc[total_key, :] = table.sum(axis=0)
+    return table.astype('int64')
+
+def build_single_answer_cube(df, question_col, profile=None, fa_threshold=20):
+    """単一回答を性別×年代×回答の件数キューブとして1回だけ集計する"""
+    # 空でない回答のみを対象（回答がない場合・FA判定の場合はスキップ）
+    valid_responses = select_valid_responses(df, question_col, profile, fa_threshold)
+    if valid_responses is None:
+        return None
+
+    return valid_responses.groupby(['gender', 'age_range', question_col], dropna=False, observed=True).size()
+
+def rollup_counts(counts, row_levels, col_levels):
+    """件数キューブを指定した軸で合計し、合計行・合計列付きのクロス集計表を作成する"""
+    # pd.crosstab と同様に集計軸が欠損している回答は除外する
+    keys = counts.reset_index()[row_levels + col_levels]
+    counts = counts[keys.notna().all(axis=1).values]
+    if counts.empty:
+        return pd.DataFrame()
 
-        # 各選択肢ごとの集計
-        for idx, row in valid_responses.iterrows():
-            results.append({
-                '性別': row['gender'],
-                '年代': row['age_range'],
-                '回答内容': row[col],
-                '選択肢': col
-            })
+    table = counts.groupby(level=row_levels + col_levels, observed=True).sum().unstack(col_levels, fill_value=0)
+    # 列が複数レベルの場合、unstackは組み合わせが欠けると列を並べ替えないため pd.crosstab と同じ順に揃える
+    return add_crosstab_margins(table.sort_index(axis=1))
+
+def rollup_cube(cube, row_levels, question_col):
+    """キューブを指定した軸で合計し、合計行・合計列付きのクロス集計表を作成する"""
+    return rollup_counts(cube, row_levels, [question_col])
+
+def process_single_answer_cube(df, question_col, profile=None, fa_threshold=20):
+    """単一回答の性別×回答・年代×回答・性別×年代×回答をキューブから一括で作成する"""
+    cube = build_single_answer_cube(df, question_col, profile, fa_threshold)
+    if cube is None:
+        return {}
+
+    crosstab = rollup_cube(cube, ['gender', 'age_range'], question_col)
+    if not crosstab.empty:
+        crosstab.index.names = ['性別', '年代']
+
+    return {
+        '性別×回答': rollup_cube(cube, ['gender'], question_col),
+        '年代×回答': rollup_cube(cube, ['age_range'], question_col),
+        '性別×年代×回答': crosstab,
+    }
+
+def get_multiple_col_sort_key(col):
+    """複数回答の選択肢カラム名からソートキーを返す"""
+    parts = col.split('_')
+    if len(parts) >= 3:
+        if parts[2].isdigit():
+            return int(parts[2])  # q_3_1 -> 1
+        else:
+            return 0  # q_3_長い質問文 -> 0
+    return 999
+
+def build_multiple_answer_long(df, question_cols, profiles=None):
+    """複数回答の質問グループを縦持ち（性別・年代・選択肢・回答内容）に変換する"""
+    sorted_question_cols = sorted(question_cols, key=get_multiple_col_sort_key)
+
+    if profiles is not None:
+        # プロファイル済みの有効回答マスクで列ごとに回答のある行だけを取り出して縦に連結
+        pieces = []
+        for col in sorted_question_cols:
+            valid = profiles[col]['valid']
+            pieces.append(pd.DataFrame({
+                '性別': df['gender'].values[valid],
+                '年代': df['age_range'].values[valid],
+                '選択肢': col,
+                '回答内容': df[col].values[valid],
+            }))
+        return pd.concat(pieces, ignore_index=True) if pieces else pd.DataFrame(columns=['性別', '年代', '選択肢', '回答内容'])
+
+    long_df = df[['gender', 'age_range'] + sorted_question_cols].melt(
+        id_vars=['gender', 'age_range'],
+        var_name='選択肢',
+        value_name='回答内容'
+    )
 
-    if not results:
-        return pd.DataFrame()
+    # 空でない回答のみを対象
+    long_df = long_df[long_df['回答内容'].notna() & (long_df['回答内容'] != '')]
 
-    result_df = pd.DataFrame(results)
+    return long_df.rename(columns={'gender': '性別', 'age_range': '年代'})
+
+def crosstab_multiple_answer(long_df, row_cols):
+    """縦持ちの複数回答データから選択肢×回答内容のクロス集計表を作成する"""
+    if long_df.empty:
+        return pd.DataFrame()
 
-    # クロス集計
     crosstab = pd.crosstab(
-        [result_df['性別'], result_df['年代']],
-        [result_df['選択肢'], result_df['回答内容']],
+        [long_df[col] for col in row_cols] if len(row_cols) > 1 else long_df[row_cols[0]],
+        [long_df['選択肢'], long_df['回答内容']],
         margins=True
     )
 
-    # カラムを数値順に並び替え
+    # カラムを数値順に並び替え（レベル0の選択肢名でソート）
     if isinstance(crosstab.columns, pd.MultiIndex):
-        # レベル0（選択肢）でソート
-        def sort_col_key(col_tuple):
-            col_name = col_tuple[0]  # 選択肢名
-            parts = col_name.split('_')
-            if len(parts) >= 3:
-                if parts[2].isdigit():
-                    return int(parts[2])
-                else:
-                    return 0  # 長い質問文は0番
-            return 999
-
-        # カラムをソート
-        sorted_cols = sorted(crosstab.columns, key=sort_col_key)
+        sorted_cols = sorted(crosstab.columns.tolist(), key=lambda col_tuple: get_multiple_col_sort_key(col_tuple[0]))
         crosstab = crosstab.reindex(columns=sorted_cols)
 
     return crosstab
 
+def process_multiple_answer_all(df, question_group, question_cols, profiles=None):
+    """複数回答の性別×回答・年代×回答・性別×年代×回答を1回の縦持ち変換から作成する"""
+    long_df = build_multiple_answer_long(df, question_cols, profiles)
+
+    return {
+        '性別×回答': crosstab_multiple_answer(long_df, ['性別']),
+        '年代×回答': crosstab_multiple_answer(long_df, ['年代']),
+        '性別×年代×回答': crosstab_multiple_answer(long_df, ['性別', '年代']),
+    }
+
+def process_multiple_answer_crosstab(df, question_group, question_cols):
+    """複数回答のクロス集計を処理"""
+    long_df = build_multiple_answer_long(df, question_cols)
+    return crosstab_multiple_answer(long_df, ['性別', '年代'])
+
 def process_multiple_answer_gender_crosstab(df, question_group, question_cols):
     """複数回答の性別×回答のクロス集計を処理"""
-    # カラムを適切な順序でソート
-    def sort_multiple_cols(cols):
-        def get_col_sort_key(col):
-            parts = col.split('_')
-            if len(parts) >= 3:
-                if parts[2].isdigit():
-                    return int(parts[2])  # q_3_1 -> 1
-                else:
-                    return 0  # q_3_長い質問文 -> 0
-            return 999
-        return sorted(cols, key=get_col_sort_key)
-
-    sorted_question_cols = sort_multiple_cols(question_cols)
-    results = []
-
-    for col in sorted_question_cols:
-        # 空でない回答のみを対象
-        valid_responses = df[df[col].notna() & (df[col] != '')]
-
-        if len(valid_responses) == 0:
+    long_df = build_multiple_answer_long(df, question_cols)
+    return crosstab_multiple_answer(long_df, ['性別'])
+
+def process_multiple_answer_age_crosstab(df, question_group, question_cols):
+    """複数回答の年代×回答のクロス集計を処理"""
+    long_df = build_multiple_answer_long(df, question_cols)
+    return crosstab_multiple_answer(long_df, ['年代'])
+
+@functools.lru_cache(maxsize=65536)
+def normalize_free_answer(value):
+    """自由回答の全角・半角の違いと空白（改行・連続した空白）の違いを統一する"""
+    return re.sub(r'\s+', ' ', unicodedata.normalize('NFKC', value)).strip()
+
+class HeavyHittersSketch:
+    """保持する回答の種類数を上限までに抑えて上位の回答を数える（Space-Saving）"""
+
+    def __init__(self, capacity=1000):
+        self.capacity = capacity
+        self.counts = {}
+        self.group_counts = {}
+        self._heap = []
+
+    def add(self, item, groups=()):
+        """回答を1件追加し、保持中の回答であればグループ（性別・年代）別の件数も数える"""
+        if item in self.counts:
+            self.counts[item] += 1
+        elif len(self.counts) < self.capacity:
+            self.counts[item] = 1
+            self.group_counts[item] = defaultdict(int)
+        else:
+            # 件数が最も少ない回答と入れ替え、その件数を引き継ぐ（入れ替え後のグループ別件数は0から数える）
+            evicted, min_count = self._pop_min()
+            del self.counts[evicted], self.group_counts[evicted]
+            self.counts[item] = min_count + 1
+            self.group_counts[item] = defaultdict(int)
+
+        for group in groups:
+            self.group_counts[item][group] += 1
+
+        heapq.heappush(self._heap, (self.counts[item], item))
+        if len(self._heap) > 4 * self.capacity:
+            # 古くなった件数の要素が溜まったらヒープを作り直す
+            self._heap = [(count, key) for key, count in self.counts.items()]
+            heapq.heapify(self._heap)
+
+    def _pop_min(self):
+        while True:
+            count, item = heapq.heappop(self._heap)
+            if self.counts.get(item) == count:
+                return item, count
+
+    def top(self, n):
+        """件数の多い順に上位n件の回答を返す"""
+        return sorted(self.counts, key=lambda item: (-self.counts[item], item))[:n]
+
+def build_fa_summary_table(sketch, top_answers, group_totals, group_col, question_col):
+    """上位回答と「その他」の件数から、合計行・合計列付きのグループ×回答の表を作成する"""
+    # 「その他」という回答自体も残りの件数と同じ「その他」の列にまとめる
+    top_answers = [answer for answer in top_answers if answer != 'その他']
+    groups = sorted(group_totals)
+    table = pd.DataFrame(
+        [[sketch.group_counts[answer].get((group_col, group), 0) for answer in top_answers] for group in groups],
+        index=pd.Index(groups, name=group_col),
+        columns=pd.Index(top_answers, name=question_col),
+        dtype='int64'
+    )
+    table['その他'] = [group_totals[group] for group in groups] - table.sum(axis=1)
+    return add_crosstab_margins(table)
+
+def summarize_fa_column(df, question_col, top_n=10, capacity=1000):
+    """FA列を1回だけ走査し、上位回答と「その他」の性別×回答・年代×回答を作成する"""
+    sketch = HeavyHittersSketch(capacity)
+    totals = {'gender': defaultdict(int), 'age_range': defaultdict(int)}
+    for answer, gender, age_range in zip(df[question_col], df['gender'], df['age_range']):
+        if not isinstance(answer, str) or not answer:
+            continue
+        answer = normalize_free_answer(answer)
+        if not answer:
             continue
 
-        # 各選択肢ごとの集計
-        for idx, row in valid_responses.iterrows():
-            results.append({
-                '性別': row['gender'],
-                '回答内容': row[col],
-                '選択肢': col
-            })
+        # pd.crosstab と同様に性別・年代が欠損している回答はその表から除外する
+        groups = []
+        for group_col, group in (('gender', gender), ('age_range', age_range)):
+            if not pd.isna(group):
+                groups.append((group_col, group))
+                totals[group_col][group] += 1
+        sketch.add(answer, groups)
+
+    if not sketch.counts:
+        return {}
+
+    # 「その他」という回答は残りの件数の「その他」にまとめるため、上位回答には数えない
+    top_answers = [answer for answer in sketch.top(top_n + 1) if answer != 'その他'][:top_n]
+    return {
+        f'性別×回答 上位{top_n}件': build_fa_summary_table(sketch, top_answers, totals['gender'], 'gender', question_col),
+        f'年代×回答 上位{top_n}件': build_fa_summary_table(sketch, top_answers, totals['age_range'], 'age_range', question_col),
+    }
+
+def summarize_fa_columns(df, df_analysis, fa_columns, top_n=10, capacity=1000):
+    """FA判定した各列の上位回答の集計表を、結果シートに追加する形式（タイトル→集計表）で返す"""
+    results = {}
+    for question in fa_columns:
+        log_item(f"  処理中: {question}")
+        question_title = get_question_title(df, question)
+        for label, table in summarize_fa_column(df_analysis, question, top_n, capacity).items():
+            if not table.empty:
+                results[f"{question_title} ({label})"] = table
+    return results
 
-    if not results:
-        return pd.DataFrame()
+def get_question_units(df, single_answer, multiple_answer, profiles):
+    """質問間クロス集計の対象とする質問（タイトルと列のリスト）を質問番号順に返す（FA判定・無回答の質問は除外）"""
+    units = []
+    for col in single_answer:
+        profile = profiles[col]
+        if not profile['is_fa'] and profile['valid'].any():
+            units.append((int(col.split('_')[1]), get_question_title(df, col), [col]))
 
-    result_df = pd.DataFrame(results)
+    for question_group, question_cols in multiple_answer.items():
+        sorted_cols = [col for col in sorted(question_cols, key=get_multiple_col_sort_key)
+                       if profiles[col]['valid'].any()]
+        if sorted_cols:
+            units.append((int(question_group.split('_')[1]),
+                          get_multiple_question_title(df, question_group, question_cols), sorted_cols))
+
+    return [(title, cols) for _, title, cols in sorted(units, key=lambda unit: unit[0])]
+
+def build_answer_indicator(question_units, profiles, n_rows, sparse=False):
+    """全質問の回答コードを1つの指示行列（回答者×質問・回答）にまとめ、質問ごとの列範囲とラベルを返す"""
+    row_parts, code_parts = [], []
+    spans, labels = [], []
+    offset = 0
+    for title, cols in question_units:
+        start = offset
+        unit_labels = []
+        for col in cols:
+            profile = profiles[col]
+            valid = profile['valid']
+            row_parts.append(np.flatnonzero(valid))
+            code_parts.append(profile['codes'][valid] + offset)
+            offset += profile['unique_answers']
+
+            # 複数回答は選択肢と回答内容の組をラベルにする
+            answers = [str(answer) for answer in profile['answers']]
+            unit_labels.extend(answers if len(cols) == 1 else [(col, answer) for answer in answers])
+        spans.append((start, offset))
+        labels.append(unit_labels)
+
+    rows = np.concatenate(row_parts) if row_parts else np.array([], dtype=np.int64)
+    codes = np.concatenate(code_parts) if code_parts else np.array([], dtype=np.int64)
+
+    if sparse:
+        from scipy import sparse as sp
+        indicator = sp.csr_matrix(
+            (np.ones(len(codes), dtype=np.int64), (rows, codes)),
+            shape=(n_rows, offset)
+        )
+    else:
+        # 行列積にBLASを使えるよう浮動小数点数で持つ（float32は回答者数が2**24未満なら件数を正確に表せる）
+        indicator = np.zeros((n_rows, offset), dtype=np.float32 if n_rows < 2 ** 24 else np.float64)
+        indicator[rows, codes] = 1
+
+    return indicator, spans, labels
+
+def tabulate_all_pairs(df, df_analysis, single_answer, multiple_answer, profiles, sparse_threshold=200,
+                       max_dense_cells=20_000_000):
+    """全質問×全質問のクロス集計表を、指示行列のグラム行列（1回の行列積）から一括で作成する"""
+    question_units = get_question_units(df, single_answer, multiple_answer, profiles)
+    if len(question_units) < 2:
+        return {}
+
+    # 回答コードの総数が多い場合、または密行列（回答者数×回答コード数）が大きくなる場合は疎行列で集計する
+    n_codes = sum(profiles[col]['unique_answers'] for _, cols in question_units for col in cols)
+    sparse = n_codes > sparse_threshold or len(df_analysis) * n_codes > max_dense_cells
+    indicator, spans, labels = build_answer_indicator(question_units, profiles, len(df_analysis), sparse=sparse)
+
+    # 2つの回答コードを同時に選んだ回答者数（対角ブロックは同じ質問どうし）
+    gram = indicator.T @ indicator
+    if sparse:
+        gram = gram.tocsr()
+
+    def to_index(unit_labels):
+        if unit_labels and isinstance(unit_labels[0], tuple):
+            return pd.MultiIndex.from_tuples(unit_labels, names=['選択肢', '回答内容'])
+        return pd.Index(unit_labels)
 
-    # クロス集計（性別×選択肢×回答内容）
-    crosstab = pd.crosstab(
-        result_df['性別'],
-        [result_df['選択肢'], result_df['回答内容']],
-        margins=True
-    )
+    results = {}
+    for i, (title1, _) in enumerate(question_units):
+        row_start, row_end = spans[i]
+        for j in range(i + 1, len(question_units)):
+            title2 = question_units[j][0]
+            col_start, col_end = spans[j]
+            block = gram[row_start:row_end, col_start:col_end]
+            block = block.toarray() if sparse else np.rint(block).astype(np.int64)
+            if not block.any():
+                continue
 
-    # === カラムを数値順に並び替え ===
-    if isinstance(crosstab.columns, pd.MultiIndex):
-        def sort_col_key(col_tuple):
-            col_name = col_tuple[0]  # 選択肢名
-            parts = col_name.split('_')
-            if len(parts) >= 3:
-                if parts[2].isdigit():
-                    return int(parts[2])  # q_3_1 -> 1
-                else:
-                    return 0  # 長い質問文は0番
-            return 999
-
-        # カラムを完全に再ソート
-        sorted_cols = sorted(crosstab.columns.tolist(), key=sort_col_key)
-        crosstab = crosstab.reindex(columns=sorted_cols)
-        print(f"  性別×回答: カラムをソートしました")
+            table = pd.DataFrame(block, index=to_index(labels[i]), columns=to_index(labels[j]))
+            results[f"{title1} × {title2}"] = add_crosstab_margins(table)
 
-    return crosstab
+    return results
 
-def process_multiple_answer_age_crosstab(df, question_group, question_cols):
-    """複数回答の年代×回答のクロス集計を処理"""
-    # カラムを適切な順序でソート
-    def sort_multiple_cols(cols):
-        def get_col_sort_key(col):
-            parts = col.split('_')
-            if len(parts) >= 3:
-                if parts[2].isdigit():
-                    return int(parts[2])  # q_3_1 -> 1
-                else:
-                    return 0  # q_3_長い質問文 -> 0
-            return 999
-        return sorted(cols, key=get_col_sort_key)
-
-    sorted_question_cols = sort_multiple_cols(question_cols)
-    results = []
-
-    for col in sorted_question_cols:
-        # 空でない回答のみを対象
-        valid_responses = df[df[col].notna() & (df[col] != '')]
-
-        if len(valid_responses) == 0:
-            continue
+def merge_counts(counts, new_counts):
+    """保存済みの件数キューブに新しい件数を加算する"""
+    if counts is None or counts.empty:
+        return new_counts
+    if new_counts is None or new_counts.empty:
+        return counts
+    merged = pd.concat([counts, new_counts])
+    return merged.groupby(level=list(range(merged.index.nlevels)), dropna=False).sum().astype('int64')
+
+def count_single_answer(df, question_col):
+    """単一回答の性別×年代×回答の件数を数える（FA判定は行わない）"""
+    valid_responses = df[df[question_col].notna() & (df[question_col] != '')]
+    return valid_responses.groupby(['gender', 'age_range', question_col], dropna=False, observed=True).size()
+
+def count_multiple_answer(df, question_cols):
+    """複数回答の性別×年代×選択肢×回答内容の件数を数える"""
+    long_df = build_multiple_answer_long(df, question_cols)
+    return long_df.groupby(['性別', '年代', '選択肢', '回答内容'], dropna=False, observed=True).size()
+
+def rollup_multiple_answer_counts(counts):
+    """複数回答の件数キューブから性別×回答・年代×回答・性別×年代×回答を作成する"""
+    tables = {}
+    for label, row_levels in [('性別×回答', ['性別']), ('年代×回答', ['年代']), ('性別×年代×回答', ['性別', '年代'])]:
+        crosstab = rollup_counts(counts, row_levels, ['選択肢', '回答内容'])
+        if not crosstab.empty:
+            # カラムを数値順に並び替え（レベル0の選択肢名でソート）
+            sorted_cols = sorted(crosstab.columns.tolist(), key=lambda col_tuple: get_multiple_col_sort_key(col_tuple[0]))
+            crosstab = crosstab.reindex(columns=sorted_cols)
+        tables[label] = crosstab
+    return tables
+
+def get_incremental_state_path(state_dir, workbook, worksheet):
+    """スプレッドシートID・シート名ごとの集計状態ファイルのパスを返す"""
+    sheet_key = hashlib.sha1(f"{workbook.id}/{worksheet.title}".encode('utf-8')).hexdigest()[:16]
+    return os.path.join(state_dir, f"{sheet_key}_state.pkl")
+
+def tabulate_incremental(workbook, worksheet, state_dir, window_rows=0, fa_threshold=20):
+    """前回集計した行以降の追加行のみを読み込み、保存済みの件数に加算してクロス集計表を作成する"""
+    df = load_title_frame(worksheet)
+    header = df.columns.tolist()
+    single_answer, multiple_answer = identify_question_columns(df)
+
+    # ヘッダー（質問構成）が変わっていなければ前回の続きから集計する
+    state_path = get_incremental_state_path(state_dir, workbook, worksheet)
+    state = pd.read_pickle(state_path) if os.path.exists(state_path) else None
+    if state is not None and state['header'] == header and state.get('fa_threshold', 20) == fa_threshold:
+        print(f"前回集計済みの{state['last_row']}行目以降の追加行を集計します")
+    else:
+        if state is not None:
+            print("ヘッダーまたはFA判定の閾値が変更されたため全行を再集計します")
+        state = {'header': header, 'fa_threshold': fa_threshold, 'last_row': 2, 'single': {}, 'multiple': {}}
+
+    chunks = []
+    for start_row, rows in iter_sheet_windows(worksheet, len(header), window_rows or 5000, start_row=state['last_row'] + 1):
+        chunks.append(pd.DataFrame(rows, columns=header))
+        state['last_row'] = start_row + len(rows) - 1
+    print(f"  {sum(len(chunk) for chunk in chunks)}行を新たに集計します")
+
+    if chunks:
+        df_new = pd.concat(chunks, ignore_index=True)
+        for question in single_answer:
+            counts = state['single'].get(question)
+            if isinstance(counts, str):
+                continue  # FA判定済み（回答の種類は減らないため再集計不要）
+            counts = merge_counts(counts, count_single_answer(df_new, question))
+            unique_answers = counts.index.get_level_values(question).nunique()
+            state['single'][question] = 'FA' if unique_answers > fa_threshold else counts
+        for question_group, question_cols in multiple_answer.items():
+            state['multiple'][question_group] = merge_counts(
+                state['multiple'].get(question_group),
+                count_multiple_answer(df_new, question_cols)
+            )
 
-        # 各選択肢ごとの集計
-        for idx, row in valid_responses.iterrows():
-            results.append({
-                '年代': row['age_range'],
-                '回答内容': row[col],
-                '選択肢': col
-            })
+    os.makedirs(state_dir, exist_ok=True)
+    pd.to_pickle(state, state_path)
 
-    if not results:
-        return pd.DataFrame()
+    results = {}
+    for question in single_answer:
+        question_title = get_question_title(df, question)
+        counts = state['single'].get(question)
+        if isinstance(counts, str):
+            log_item(f"  {question}: FA判定でスキップ")
+            continue
+        if counts is None or counts.empty:
+            continue
 
-    result_df = pd.DataFrame(results)
+        crosstab = rollup_cube(counts, ['gender', 'age_range'], question)
+        if not crosstab.empty:
+            crosstab.index.names = ['性別', '年代']
+        tables = {
+            '性別×回答': rollup_cube(counts, ['gender'], question),
+            '年代×回答': rollup_cube(counts, ['age_range'], question),
+            '性別×年代×回答': crosstab,
+        }
+        for label, crosstab in tables.items():
+            if not crosstab.empty:
+                results[f"{question_title} ({label})"] = crosstab
 
-    # クロス集計（年代×選択肢×回答内容）
-    crosstab = pd.crosstab(
-        result_df['年代'],
-        [result_df['選択肢'], result_df['回答内容']],
-        margins=True
-    )
+    for question_group, question_cols in multiple_answer.items():
+        counts = state['multiple'].get(question_group)
+        if counts is None or counts.empty:
+            continue
+        question_title = get_multiple_question_title(df, question_group, question_cols)
+        for label, crosstab in rollup_multiple_answer_counts(counts).items():
+            if not crosstab.empty:
+                results[f"{question_title} ({label})"] = crosstab
 
-    # === カラムを数値順に並び替え ===
-    if isinstance(crosstab.columns, pd.MultiIndex):
-        def sort_col_key(col_tuple):
-            col_name = col_tuple[0]  # 選択肢名
-            parts = col_name.split('_')
-            if len(parts) >= 3:
-                if parts[2].isdigit():
-                    return int(parts[2])  # q_3_1 -> 1
-                else:
-                    return 0  # 長い質問文は0番
-            return 999
-
-        # カラムを完全に再ソート
-        sorted_cols = sorted(crosstab.columns.tolist(), key=sort_col_key)
-        crosstab = crosstab.reindex(columns=sorted_cols)
-        print(f"  年代×回答: カラムをソートしました")
+    return results
 
-    return crosstab
+class QuestionResultCache:
+    """質問ごとの集計表と書き込み用の値を、集計に使う列の内容のハッシュをキーにして保存する（サイズ上限付きLRU）"""
+
+    def __init__(self, cache_dir, max_bytes=500 * 1024 * 1024):
+        self.cache_dir = cache_dir
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        os.makedirs(cache_dir, exist_ok=True)
+        # 上限サイズを下げた場合に備えて開いた時点でも削除する
+        self.evict()
+
+    @staticmethod
+    def hash_columns(df, columns, *params):
+        """カラムの値と型、その他のパラメータからハッシュ値を作成する"""
+        columns = list(columns)
+        digest = hashlib.sha1(json.dumps(
+            [columns, [str(df[col].dtype) for col in columns], *params], ensure_ascii=False
+        ).encode('utf-8'))
+        for col in columns:
+            digest.update(pd.util.hash_pandas_object(df[col], index=False).values.tobytes())
+        return digest.hexdigest()
+
+    def hash_banner_columns(self, df):
+        """全質問で共通の性別・年代カラムのハッシュ値を作成する（1回の実行で1度だけ計算する）"""
+        return self.hash_columns(df, ['gender', 'age_range'])
+
+    def make_key(self, df, question_cols, banner_digest, fa_threshold=20, variant=''):
+        """性別・年代のハッシュ値、質問カラムの値と型、FA判定の閾値、集計方式からキーを作成する"""
+        return self.hash_columns(df, question_cols, banner_digest, fa_threshold, variant)
+
+    def get(self, key):
+        """保存済みの結果を返す（ない場合はNone）。使用日時を更新してLRUの順序に反映する"""
+        path = os.path.join(self.cache_dir, f"{key}.pkl")
+        try:
+            entry = pd.read_pickle(path)
+        except Exception:
+            self.misses += 1
+            return None
+        os.utime(path)
+        self.hits += 1
+        return entry
+
+    def put(self, key, entry):
+        """結果を保存する（上限サイズを超えた分は実行の最後に evict でまとめて削除する）"""
+        path = os.path.join(self.cache_dir, f"{key}.pkl")
+        temp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        pd.to_pickle(entry, temp_path)
+        os.replace(temp_path, path)
+
+    def evict(self):
+        """合計サイズが上限以下になるまで、最後に使ってから長いファイルを削除する"""
+        files = []
+        for name in os.listdir(self.cache_dir):
+            if name.endswith('.pkl'):
+                try:
+                    stat = os.stat(os.path.join(self.cache_dir, name))
+                except FileNotFoundError:
+                    continue
+                files.append((stat.st_mtime, stat.st_size, name))
+
+        total = sum(size for _, size, _ in files)
+        for _, size, name in sorted(files):
+            if total <= self.max_bytes:
+                break
+            try:
+                os.remove(os.path.join(self.cache_dir, name))
+            except FileNotFoundError:
+                pass
+            total -= size
+
+    def report(self):
+        """今回の実行のヒット数・ミス数を表示する"""
+        print(f"集計結果キャッシュ: 再利用{self.hits}問、再集計{self.misses}問")
+        metrics = current_metrics()
+        if metrics is not None:
+            metrics.counts.update({'result_cache_hits': self.hits, 'result_cache_misses': self.misses})
+
+def collect_question_tables(results, blocks, question_title, tables, cached_blocks=None):
+    """1問分の集計表を結果に追加し、書き込み用の値（キャッシュ済みのものは再利用）をまとめて返す"""
+    question_blocks = {}
+    for label, crosstab in tables.items():
+        if crosstab is None or crosstab.empty:
+            continue
+        title = f"{question_title} ({label})"
+        results[title] = crosstab
+        if blocks is not None:
+            block = (cached_blocks or {}).get(title)
+            question_blocks[title] = block if block is not None else serialize_crosstab_block(title, crosstab)
+            blocks[title] = question_blocks[title]
+    return question_blocks
 
 def convert_to_proper_types(value):
     """値を適切な型に変換する関数"""
@@ -382,173 +1370,667 @@ def convert_to_proper_types(value):
         # 数値変換できない場合は文字列として返す
         return str_value
 
-def create_summary_sheet(workbook, results, sheet_name_prefix="クロス集計結果"):
-    """結果をスプレッドシートに書き込む"""
-    try:
-        # 既存のシートがあれば削除
-        try:
-            existing_sheet = workbook.worksheet(sheet_name_prefix)
-            workbook.del_worksheet(existing_sheet)
-            print(f"既存の '{sheet_name_prefix}' シートを削除しました")
-        except gspread.WorksheetNotFound:
-            print(f"'{sheet_name_prefix}' シートは存在しないため、新規作成します")
+def serialize_column_values(values):
+    """集計表の1列分を書き込み用の値に変換する（整数列はそのままPythonのintにする）"""
+    if pd.api.types.is_integer_dtype(values.dtype):
+        return values.tolist()
+    return [convert_to_proper_types(value) for value in values.tolist()]
 
-        # 新しいシートを作成
-        worksheet = workbook.add_worksheet(title=sheet_name_prefix, rows=1000, cols=20)
-        print(f"新しいシート '{sheet_name_prefix}' を作成しました")
+def serialize_crosstab_block(question, crosstab):
+    """1つの集計表をタイトル・ヘッダー・データ行・空行からなる行リストに変換する"""
+    block = [[convert_to_proper_types(f'【{question}】')], ['']]
 
-        current_row = 1
-        all_data = []  # 一括更新用のデータ配列
+    # ヘッダー行を準備（ラベルは数値に見えるものを数値に変換）
+    if isinstance(crosstab.columns, pd.MultiIndex):
+        for level in range(crosstab.columns.nlevels):
+            block.append([''] + [convert_to_proper_types(str(label))
+                                 for label in crosstab.columns.get_level_values(level)])
+    else:
+        block.append([''] + [convert_to_proper_types(str(col)) for col in crosstab.columns])
+
+    # 行ラベルとデータ部分を列ごとに変換して行にまとめる
+    row_labels = [convert_to_proper_types(' / '.join(str(i) for i in idx) if isinstance(idx, tuple) else str(idx))
+                  for idx in crosstab.index]
+    columns = [serialize_column_values(crosstab.iloc[:, i]) for i in range(crosstab.shape[1])]
+    block.extend([label, *values] for label, values in zip(row_labels, zip(*columns)))
+
+    # 空行を追加
+    block.append([''])
+    block.append([''])
+    return block
+
+def build_summary_values(results, blocks=None):
+    """全集計表を書き込み用の値に変換し、列数を揃えた1つの表にまとめる（blocksに変換済みの値があれば再利用する）"""
+    all_data = []
+    for question, crosstab in results.items():
+        if crosstab.empty:
+            log_item(f"  {question}: データが空のためスキップ")
+            continue
 
-        for question, crosstab in results.items():
-            if crosstab.empty:
-                print(f"  {question}: データが空のためスキップ")
-                continue
+        log_item(f"  {question}: データを書き込み中...")
+        block = blocks.get(question) if blocks else None
+        all_data.extend(block if block is not None else serialize_crosstab_block(question, crosstab))
+
+    if not all_data:
+        return []
+
+    # 各行を最大列数に揃える
+    max_cols = max(len(row) for row in all_data)
+    return [row + [''] * (max_cols - len(row)) for row in all_data]
+
+def split_rows_by_payload(values, max_payload_bytes):
+    """書き込みデータを1リクエストあたりのサイズ上限以内の行ブロックに分割し、(行ブロック, バイト数) のリストを返す"""
+    chunks = []
+    chunk = []
+    chunk_bytes = 0
+    for row in values:
+        row_bytes = len(json.dumps(row, ensure_ascii=False).encode('utf-8'))
+        if chunk and chunk_bytes + row_bytes > max_payload_bytes:
+            chunks.append((chunk, chunk_bytes))
+            chunk = []
+            chunk_bytes = 0
+        chunk.append(row)
+        chunk_bytes += row_bytes
+    if chunk:
+        chunks.append((chunk, chunk_bytes))
+    return chunks
+
+def write_values_chunked(worksheet, values, max_payload_bytes=2_000_000):
+    """データをサイズ上限ごとに分割し、A1から順に再試行付きで書き込む"""
+    n_cols = max(len(row) for row in values)
+    start_row = 1
+    for chunk, chunk_bytes in split_rows_by_payload(values, max_payload_bytes):
+        end_row = start_row + len(chunk) - 1
+        range_name = f"{rowcol_to_a1(start_row, 1)}:{rowcol_to_a1(end_row, n_cols)}"
+
+        # gspreadのupdate関数で値の型を指定
+        call_api(
+            'update', worksheet.update,
+            values=chunk,
+            range_name=range_name,
+            value_input_option='USER_ENTERED'  # ユーザー入力として扱う（数値は数値として認識）
+        )
+        record_transfer(bytes_written=chunk_bytes)
+        log_item(f"  データを範囲 {range_name} に書き込みました")
+        start_row = end_row + 1
+
+def find_changed_row_ranges(current_values, new_values):
+    """現在のシートの値と新しい値を比較し、変更のあった連続行の範囲 (開始行, 終了行) を返す（1始まり）"""
+    ranges = []
+    start_row = None
+    for i in range(max(len(current_values), len(new_values))):
+        current_row = current_values[i] if i < len(current_values) else []
+        new_row = new_values[i] if i < len(new_values) else []
+        if current_row != new_row:
+            if start_row is None:
+                start_row = i + 1
+        elif start_row is not None:
+            ranges.append((start_row, i))
+            start_row = None
+    if start_row is not None:
+        ranges.append((start_row, max(len(current_values), len(new_values))))
+    return ranges
+
+def update_sheet_in_place(worksheet, values, max_payload_bytes=2_000_000):
+    """既存シートの値を読み戻して比較し、変更のあった行範囲のみをまとめて更新する"""
+    # 数値を数値のまま比較できるよう書式なしの値で読み戻す
+    current_values = call_api('get_values', worksheet.get_values, value_render_option='UNFORMATTED_VALUE')
+    n_cols = max([len(row) for row in current_values] + [len(row) for row in values] + [1])
+    current_values = [list(row) + [''] * (n_cols - len(row)) for row in current_values]
+    new_values = [list(row) + [''] * (n_cols - len(row)) for row in values]
+
+    # 読み戻した値は末尾の空行が省略されるため行数を揃える（新しい結果が短い場合は残った行を空にする）
+    n_rows = max(len(current_values), len(new_values))
+    current_values += [[''] * n_cols for _ in range(n_rows - len(current_values))]
+    new_values += [[''] * n_cols for _ in range(n_rows - len(new_values))]
+
+    # 書き込み範囲がシートのサイズを超える場合のみシートを拡張する
+    if len(new_values) > worksheet.row_count or n_cols > worksheet.col_count:
+        call_api('resize', worksheet.resize, rows=max(len(new_values), worksheet.row_count),
+                        cols=max(n_cols, worksheet.col_count))
+
+    changed_ranges = find_changed_row_ranges(current_values, new_values)
+    if not changed_ranges:
+        print("  変更された範囲はありません")
+        return
+
+    # 変更範囲ごとの更新をサイズ上限以内でまとめ、batch_updateで送信する
+    updates = []
+    for start_row, end_row in changed_ranges:
+        for chunk, chunk_bytes in split_rows_by_payload(new_values[start_row - 1:end_row], max_payload_bytes):
+            end = start_row + len(chunk) - 1
+            updates.append(({
+                'range': f"{rowcol_to_a1(start_row, 1)}:{rowcol_to_a1(end, n_cols)}",
+                'values': chunk,
+            }, chunk_bytes))
+            start_row = end + 1
+
+    batch = []
+    batch_bytes = 0
+    for update, update_bytes in updates + [(None, 0)]:
+        if batch and (update is None or batch_bytes + update_bytes > max_payload_bytes):
+            call_api('batch_update', worksheet.batch_update, batch, value_input_option='USER_ENTERED')
+            record_transfer(bytes_written=batch_bytes)
+            log_item(f"  {len(batch)}範囲を更新しました: {', '.join(item['range'] for item in batch)}")
+            batch = []
+            batch_bytes = 0
+        if update is not None:
+            batch.append(update)
+            batch_bytes += update_bytes
+
+    changed_rows = sum(end_row - start_row + 1 for start_row, end_row in changed_ranges)
+    print(f"  {len(new_values)}行中{changed_rows}行（{len(changed_ranges)}範囲）を更新しました")
+
+def create_summary_sheet(workbook, results, sheet_name_prefix="クロス集計結果", update_in_place=False, blocks=None):
+    """結果をスプレッドシートに書き込む"""
+    from gspread import WorksheetNotFound
 
-            print(f"  {question}: データを書き込み中...")
-
-            # 質問タイトルを追加
-            all_data.append([f'【{question}】'])
-            all_data.append([''])  # 空行
-
-            # ヘッダー行を準備
-            if isinstance(crosstab.columns, pd.MultiIndex):
-                # 複数レベルのカラムの場合
-                header_rows = []
-                for level in range(crosstab.columns.nlevels):
-                    header_row = [''] + [str(col[level]) if isinstance(col, tuple) else str(col)
-                                        for col in crosstab.columns]
-                    header_rows.append(header_row)
-                all_data.extend(header_rows)
-            else:
-                # 単一レベルのカラムの場合
-                headers = [''] + [str(col) for col in crosstab.columns]
-                all_data.append(headers)
+    try:
+        existing_sheet = None
+        try:
+            existing_sheet = call_api('worksheet', workbook.worksheet, sheet_name_prefix)
+        except WorksheetNotFound:
+            print(f"'{sheet_name_prefix}' シートは存在しないため、新規作成します")
 
-            # データ行を追加（型変換を適用）
-            for idx, row in crosstab.iterrows():
-                if isinstance(idx, tuple):
-                    idx_str = ' / '.join(str(i) for i in idx)
-                else:
-                    idx_str = str(idx)
+        # 集計表をまとめて書き込み用の値に変換
+        with metrics_stage('serialize'):
+            processed_data = build_summary_values(results, blocks)
 
-                # 各値を適切な型に変換
-                row_data = [idx_str] + [convert_to_proper_types(val) for val in row.values]
-                all_data.append(row_data)
+        if update_in_place and existing_sheet is not None:
+            # 既存のシートを残したまま変更のあった範囲のみを更新
+            with metrics_stage('write'):
+                update_sheet_in_place(existing_sheet, processed_data)
+            print(f"結果を '{sheet_name_prefix}' シートに保存完了しました")
+            return
 
-            # 空行を追加
-            all_data.append([''])
-            all_data.append([''])
+        # 既存のシートがあれば削除
+        if existing_sheet is not None:
+            call_api('del_worksheet', workbook.del_worksheet, existing_sheet)
+            print(f"既存の '{sheet_name_prefix}' シートを削除しました")
 
         # データを一括で書き込み
-        if all_data:
-            # 最大列数を計算
-            max_cols = max(len(row) for row in all_data)
-            # 各行を同じ長さに調整
-            for row in all_data:
-                while len(row) < max_cols:
-                    row.append('')
-
-            # 値の型変換処理を追加
-            print("  データの型変換を実行中...")
-            processed_data = []
-            for row in all_data:
-                processed_row = []
-                for cell in row:
-                    processed_row.append(convert_to_proper_types(cell))
-                processed_data.append(processed_row)
-
-            # A1から一括更新
-            range_name = f'A1:{chr(65 + max_cols - 1)}{len(processed_data)}'
-
-            # gspreadのupdate関数で値の型を指定
-            worksheet.update(
-                values=processed_data,
-                range_name=range_name,
-                value_input_option='USER_ENTERED'  # ユーザー入力として扱う（数値は数値として認識）
+        if processed_data:
+            max_cols = len(processed_data[0])
+
+            # 書き込むデータに合わせたサイズで新しいシートを作成
+            worksheet = call_api(
+                'add_worksheet', workbook.add_worksheet,
+                title=sheet_name_prefix,
+                rows=len(processed_data),
+                cols=max_cols
             )
-            print(f"  データを範囲 {range_name} に一括書き込みしました")
+            print(f"新しいシート '{sheet_name_prefix}' を作成しました（{len(processed_data)}行 × {max_cols}列）")
+
+            with metrics_stage('write'):
+                write_values_chunked(worksheet, processed_data)
+        else:
+            # 新しいシートを作成
+            worksheet = call_api('add_worksheet', workbook.add_worksheet, title=sheet_name_prefix, rows=1000, cols=20)
+            print(f"新しいシート '{sheet_name_prefix}' を作成しました")
 
         print(f"結果を '{sheet_name_prefix}' シートに保存完了しました")
 
     except Exception as e:
+        # 書き込みに失敗したブックをバッチ処理の結果に「失敗」として残すため、呼び出し元に伝える
         print(f"シート作成中にエラーが発生しました: {e}")
-        import traceback
-        traceback.print_exc()
+        raise
+
+# 並列集計時に各ワーカーが参照する集計対象データ（プロセス方式ではforkで共有される）
+# バッチ処理で複数の集計が同時に走るため、データごとのキーで登録する
+_SHARED_SURVEY_FRAMES = {}
+
+def tabulate_single_question(frame_key, question, cube_mode=True):
+    """単一回答1問分の性別×回答・年代×回答・性別×年代×回答を作成する"""
+    df, profiles = _SHARED_SURVEY_FRAMES[frame_key]
+    profile = profiles[question]
+    if cube_mode:
+        # 性別×年代×回答のキューブから3つの集計表を作成
+        return process_single_answer_cube(df, question, profile)
+
+    return {
+        '性別×回答': process_gender_crosstab(df, question, profile),
+        '年代×回答': process_age_crosstab(df, question, profile),
+        '性別×年代×回答': process_single_answer_crosstab(df, question, profile),
+    }
+
+def tabulate_multiple_question(frame_key, question_group, question_cols):
+    """複数回答1問分の性別×回答・年代×回答・性別×年代×回答を作成する"""
+    df, profiles = _SHARED_SURVEY_FRAMES[frame_key]
+    return process_multiple_answer_all(df, question_group, question_cols, profiles)
+
+def timed_call(func, *args):
+    """関数を実行し、(戻り値, 所要秒数) を返す"""
+    started = time.perf_counter()
+    result = func(*args)
+    return result, time.perf_counter() - started
+
+def map_questions(func, args_list, workers=0, backend="thread"):
+    """質問ごとの集計を実行し、入力と同じ順序で (結果, 所要秒数) を返す（workersが2以上なら並列実行）"""
+    args_list = [(func, *args) for args in args_list]
+    if workers <= 1 or len(args_list) <= 1:
+        return [timed_call(*args) for args in args_list]
+
+    # ワーカーにも呼び出し元の集計の静音モードを引き継ぐ
+    if backend == "process":
+        # forkで起動し、共有データを子プロセスにコピーせず引き継ぐ
+        executor = ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context('fork'),
+                                       initializer=set_quiet, initargs=(is_quiet(),))
+    else:
+        executor = ThreadPoolExecutor(max_workers=workers, initializer=set_quiet, initargs=(is_quiet(),))
+
+    with executor:
+        return list(executor.map(timed_call, *zip(*args_list)))
+
+def quote_sql_identifier(name):
+    """SQLの列名として使えるよう二重引用符で囲む"""
+    return '"' + str(name).replace('"', '""') + '"'
+
+def quote_sql_string(value):
+    """SQLの文字列リテラルとして使えるよう単一引用符で囲む"""
+    return "'" + str(value).replace("'", "''") + "'"
+
+def open_duckdb_survey(path, workers=0):
+    """CSV・ParquetファイルをDuckDBで開き、タイトル行のdfと回答行を文字列で返すクエリ（ビュー survey）を用意する"""
+    import duckdb
+
+    # 1行目（ヘッダー）と2行目（タイトル行）だけを先に読み込む
+    header_rows = []
+    for rows in iter_file_rows(path, chunk_rows=2):
+        header_rows.extend(rows)
+        if len(header_rows) >= 2:
+            break
+    if not header_rows:
+        raise ValueError(f"ファイルにデータがありません: {path}")
+    df = build_title_frame(header_rows)
+    header = df.columns.tolist()
+
+    connection = duckdb.connect()
+    if workers > 0:
+        connection.execute(f"SET threads = {int(workers)}")
+
+    extension = os.path.splitext(path)[1].lower()
+    if extension == '.csv':
+        names = ', '.join(quote_sql_string(col) for col in header)
+        source = (f"read_csv({quote_sql_string(path)}, header = true, all_varchar = true, "
+                  f"delim = ',', quote = '\"', escape = '\"', names = [{names}])")
+        types = {col: 'VARCHAR' for col in header}
+    elif extension == '.parquet':
+        source = f"read_parquet({quote_sql_string(path)})"
+        types = dict(connection.execute(f"SELECT column_name, column_type FROM (DESCRIBE SELECT * FROM {source})").fetchall())
+    else:
+        raise ValueError(f"DuckDBでの集計はCSV・Parquetファイルのみ対応しています: {path}")
+
+    # 空のセルは空文字、整数値の小数は整数の文字列にして、スプレッドシートの表示値（file_cell_to_str）と揃える
+    columns = []
+    for col in header:
+        name = quote_sql_identifier(col)
+        if types[col] in ('DOUBLE', 'FLOAT'):
+            value = (f"CASE WHEN {name} = trunc({name}) THEN CAST(CAST({name} AS BIGINT) AS VARCHAR) "
+                     f"ELSE CAST({name} AS VARCHAR) END")
+        else:
+            value = f"CAST({name} AS VARCHAR)"
+        columns.append(f"coalesce({value}, '') AS {name}")
+
+    # 先頭の回答行（タイトル行）を除く（DuckDBは読み込み順を保持する）
+    connection.execute(f"CREATE VIEW survey AS SELECT {', '.join(columns)} FROM {source} OFFSET 1")
+    return connection, df
+
+def count_answers_duckdb(connection, question_cols):
+    """指定した質問カラムの回答を縦持ちにして、性別×年代×カラム×回答の件数を1回のクエリで数える"""
+    if not question_cols:
+        return pd.DataFrame(columns=['gender', 'age_range', 'question', 'answer', 'count'])
+
+    columns = ', '.join(quote_sql_identifier(col) for col in question_cols)
+    return connection.execute(f"""
+        SELECT gender, age_range, question, answer, count(*) AS count
+        FROM (UNPIVOT (SELECT gender, age_range, {columns} FROM survey)
+              ON {columns} INTO NAME question VALUE answer)
+        WHERE answer <> ''
+        GROUP BY ALL
+        ORDER BY ALL
+    """).df()
+
+def tabulate_survey_duckdb(path, fa_threshold=20, workers=0):
+    """CSV・ParquetファイルをDuckDBで集計し、pandasでの集計と同じ形式の集計結果（タイトル→集計表）を返す"""
+    metrics = current_metrics()
+
+    with metrics_stage('load'):
+        connection, df = open_duckdb_survey(path, workers=workers)
+
+    try:
+        single_answer, multiple_answer = identify_question_columns(df)
+        print(f"単一回答質問: {len(single_answer)}問、複数回答質問: {len(multiple_answer)}問")
+
+        # 単一回答の回答の種類数を1回のクエリで数え、FA判定した列は件数の集計から除く
+        fa_columns = []
+        with metrics_stage('profile_question_columns'):
+            if single_answer:
+                distinct_counts = connection.execute("SELECT " + ', '.join(
+                    f"count(DISTINCT nullif({quote_sql_identifier(col)}, ''))" for col in single_answer
+                ) + " FROM survey").fetchone()
+                fa_columns = [col for col, n in zip(single_answer, distinct_counts) if n > fa_threshold]
+            n_rows = connection.execute("SELECT count(*) FROM survey").fetchone()[0]
+
+        for col in fa_columns:
+            log_item(f"  {col}: FA判定でスキップ")
+
+        # 性別×年代×カラム×回答の件数をDuckDBで並列に数え、集計表への変換は件数（小さい表）に対してのみ行う
+        print("\nDuckDBでクロス集計処理中...")
+        with metrics_stage('tabulate_duckdb'):
+            question_cols = ([col for col in single_answer if col not in fa_columns]
+                             + [col for cols in multiple_answer.values() for col in cols])
+            counts = count_answers_duckdb(connection, question_cols)
+    finally:
+        connection.close()
+
+    if metrics is not None:
+        metrics.counts.update({
+            'fa_questions': len(fa_columns),
+            'rows': n_rows,
+            'columns': len(df.columns),
+            'single_questions': len(single_answer),
+            'multiple_questions': len(multiple_answer),
+        })
 
-def run_survey_crosstab(spreadsheet_url, sheet_name):
+    results = {}
+    counts_by_question = dict(list(counts.groupby('question', sort=False)))
+    for question in single_answer:
+        question_counts = counts_by_question.get(question)
+        if question in fa_columns or question_counts is None:
+            continue
+
+        # pandasでの集計と同じ性別×年代×回答のキューブにしてから各集計表を作成する
+        cube = question_counts.set_index(['gender', 'age_range', 'answer'])['count'].rename_axis(
+            ['gender', 'age_range', question])
+        crosstab = rollup_cube(cube, ['gender', 'age_range'], question)
+        crosstab.index.names = ['性別', '年代']
+        tables = {
+            '性別×回答': rollup_cube(cube, ['gender'], question),
+            '年代×回答': rollup_cube(cube, ['age_range'], question),
+            '性別×年代×回答': crosstab,
+        }
+
+        question_title = get_question_title(df, question)
+        for label, table in tables.items():
+            results[f"{question_title} ({label})"] = table
+
+    for question_group, question_cols in multiple_answer.items():
+        pieces = [counts_by_question[col] for col in question_cols if col in counts_by_question]
+        if not pieces:
+            continue
+
+        counts_long = pd.concat(pieces).set_index(['gender', 'age_range', 'question', 'answer'])['count'].rename_axis(
+            ['性別', '年代', '選択肢', '回答内容'])
+        tables = rollup_multiple_answer_counts(counts_long)
+
+        question_title = get_multiple_question_title(df, question_group, question_cols)
+        for label, table in tables.items():
+            results[f"{question_title} ({label})"] = table
+
+    return results
+
+def run_survey_crosstab(spreadsheet_url, sheet_name, cube_mode=True, categorical=False,
+                        cache_dir=None, refresh_cache=False, window_rows=0, state_dir=None,
+                        workers=0, backend="thread", gc=None, quiet=False, report_path=None,
+                        fa_threshold=20, skip_fa_columns=False, update_in_place=False, output_path=None,
+                        all_pairs=False, planned_load=False, result_cache_dir=None, result_cache_max_mb=500,
+                        fa_summary=False, fa_summary_top_n=10, fa_summary_capacity=1000, engine="pandas"):
     """メイン処理：アンケートクロス集計を実行"""
+    # 静音モードはこの集計（スレッド）だけに設定し、終了後に元に戻す
+    previous_quiet = is_quiet()
+    set_quiet(quiet)
+
+    # 段階ごとの処理時間・API呼び出し数などを記録する
+    metrics = RunMetrics(spreadsheet_url, sheet_name)
+    _RUN_CONTEXT.metrics = metrics
+    try:
+        return tabulate_survey(
+            spreadsheet_url, sheet_name,
+            cube_mode=cube_mode,
+            categorical=categorical,
+            cache_dir=cache_dir,
+            refresh_cache=refresh_cache,
+            window_rows=window_rows,
+            state_dir=state_dir,
+            workers=workers,
+            backend=backend,
+            gc=gc,
+            fa_threshold=fa_threshold,
+            skip_fa_columns=skip_fa_columns,
+            update_in_place=update_in_place,
+            output_path=output_path,
+            all_pairs=all_pairs,
+            planned_load=planned_load,
+            result_cache_dir=result_cache_dir,
+            result_cache_max_mb=result_cache_max_mb,
+            fa_summary=fa_summary,
+            fa_summary_top_n=fa_summary_top_n,
+            fa_summary_capacity=fa_summary_capacity,
+            engine=engine
+        )
+    finally:
+        _RUN_CONTEXT.metrics = None
+        set_quiet(previous_quiet)
+        metrics.elapsed_sec = time.time() - metrics.started_at
+        if report_path:
+            metrics.save(report_path)
+
+def tabulate_survey(spreadsheet_url, sheet_name, cube_mode=True, categorical=False,
+                    cache_dir=None, refresh_cache=False, window_rows=0, state_dir=None,
+                    workers=0, backend="thread", gc=None, fa_threshold=20, skip_fa_columns=False,
+                    update_in_place=False, output_path=None, all_pairs=False, planned_load=False,
+                    result_cache_dir=None, result_cache_max_mb=500,
+                    fa_summary=False, fa_summary_top_n=10, fa_summary_capacity=1000, engine="pandas"):
+    """データの読み込みから集計・スプレッドシート（またはファイル）への保存までを実行する"""
+    metrics = current_metrics()
+    local_source = is_local_source(spreadsheet_url)
+
+    if local_source and not output_path:
+        # ファイル入力で出力先の指定がない場合は入力ファイルと同じ場所にCSVで保存する
+        output_path = f"{os.path.splitext(spreadsheet_url)[0]}_クロス集計結果.csv"
+
+    if state_dir and local_source:
+        raise ValueError("差分集計（state_dir）はスプレッドシートからの読み込みのみ対応しています")
+
+    if state_dir:
+        if all_pairs:
+            print("差分集計では質問間クロス集計を作成しません")
+        if fa_summary:
+            print("差分集計ではFA列の上位回答を集計しません")
+        print("追加行の差分集計中...")
+        workbook, worksheet = open_survey_worksheet(spreadsheet_url, sheet_name, gc=gc)
+        with metrics_stage('tabulate_incremental'):
+            results = tabulate_incremental(workbook, worksheet, state_dir, window_rows=window_rows,
+                                           fa_threshold=fa_threshold)
+        return save_survey_results(workbook, results, update_in_place=update_in_place, output_path=output_path)
+
+    if engine == "duckdb":
+        # 大規模なCSV・ParquetファイルはDuckDBで並列に集計する（pandasでの集計と同じ集計表を返す）
+        if not local_source:
+            raise ValueError("DuckDBでの集計はCSV・Parquetファイルからの読み込みのみ対応しています")
+        for enabled, feature in ((all_pairs, "質問間クロス集計"), (fa_summary, "FA列の上位回答の集計"),
+                                 (result_cache_dir, "集計結果キャッシュ"), (skip_fa_columns, "FA列の削除")):
+            if enabled:
+                print(f"DuckDBでの集計では{feature}を使用しません")
+        print("DuckDBでデータを集計中...")
+        results = tabulate_survey_duckdb(spreadsheet_url, fa_threshold=fa_threshold, workers=workers)
+        return save_survey_results(None, results, update_in_place=update_in_place, output_path=output_path)
+    elif engine != "pandas":
+        raise ValueError(f"集計エンジンは pandas・duckdb のいずれかを指定してください: {engine}")
+
     print("データ読み込み中...")
-    df, df_analysis, workbook = load_survey_data(spreadsheet_url, sheet_name)
+    with metrics_stage('load'):
+        if local_source:
+            workbook = None
+            df, df_analysis = load_survey_file(
+                spreadsheet_url, sheet_name,
+                categorical=categorical,
+                chunk_rows=window_rows
+            )
+        else:
+            df, df_analysis, workbook = load_survey_data(
+                spreadsheet_url, sheet_name,
+                categorical=categorical,
+                cache_dir=cache_dir,
+                refresh_cache=refresh_cache,
+                window_rows=window_rows,
+                gc=gc,
+                planned=planned_load,
+                fa_threshold=fa_threshold,
+                keep_fa_columns=fa_summary
+            )
 
     print("質問カラムを識別中...")
-    single_answer, multiple_answer = identify_question_columns(df_analysis)
-
-    print(f"単一回答質問: {single_answer}")
-    print(f"複数回答質問: {list(multiple_answer.keys())}")
+    with metrics_stage('identify_question_columns'):
+        single_answer, multiple_answer = identify_question_columns(df_analysis)
+
+    log_item(f"単一回答質問: {single_answer}")
+    log_item(f"複数回答質問: {list(multiple_answer.keys())}")
+    print(f"単一回答質問: {len(single_answer)}問、複数回答質問: {len(multiple_answer)}問")
+
+    # 全質問カラムの有効回答マスク・回答の種類・FA判定を1回の走査で求める
+    with metrics_stage('profile_question_columns'):
+        question_cols = single_answer + [col for cols in multiple_answer.values() for col in cols]
+        profiles = profile_question_columns(df_analysis, question_cols, fa_threshold)
+
+    fa_columns = [col for col in single_answer if profiles[col]['is_fa']]
+    fa_results = {}
+    if fa_summary and fa_columns:
+        # FA判定した列は削除する前に上位回答だけを集計しておく
+        print("\nFA列の上位回答を集計中...")
+        with metrics_stage('summarize_fa'):
+            fa_results = summarize_fa_columns(df, df_analysis, fa_columns, top_n=fa_summary_top_n,
+                                              capacity=fa_summary_capacity)
+        if metrics is not None:
+            metrics.counts['fa_summary_tables'] = len(fa_results)
+
+    if skip_fa_columns and fa_columns:
+        # FA判定した列は集計しないため集計対象データから削除する
+        df_analysis = df_analysis.drop(columns=fa_columns)
+        print(f"FA判定した{len(fa_columns)}列を集計対象から削除しました")
+
+    if metrics is not None:
+        metrics.counts.update({
+            'fa_questions': len(fa_columns),
+            'rows': len(df_analysis),
+            'columns': df_analysis.shape[1],
+            'single_questions': len(single_answer),
+            'multiple_questions': len(multiple_answer),
+        })
 
     results = {}
-
-    # 単一回答の処理
-    print("\n単一回答のクロス集計処理中...")
-    for question in single_answer:
-        print(f"  処理中: {question}")
+    blocks = None
+
+    # 集計結果キャッシュ：集計に使う列の内容が前回と同じ質問は保存済みの集計表を再利用する
+    result_cache = None
+    single_keys, multiple_keys = [], []
+    single_cached, multiple_cached = [], []
+    if result_cache_dir:
+        result_cache = QuestionResultCache(result_cache_dir, max_bytes=int(result_cache_max_mb * 1024 * 1024))
+        blocks = {}
+        single_variant = 'single_cube' if cube_mode else 'single'
+        banner_digest = result_cache.hash_banner_columns(df_analysis)
+        for question in single_answer:
+            # FA判定で削除した列は集計対象データにないためキャッシュしない
+            key = (result_cache.make_key(df_analysis, [question], banner_digest, fa_threshold, single_variant)
+                   if question in df_analysis.columns else None)
+            single_keys.append(key)
+            single_cached.append(result_cache.get(key) if key else None)
+        for question_group, question_cols in multiple_answer.items():
+            key = result_cache.make_key(df_analysis, question_cols, banner_digest, fa_threshold, 'multiple')
+            multiple_keys.append(key)
+            multiple_cached.append(result_cache.get(key))
+    else:
+        single_keys, single_cached = [None] * len(single_answer), [None] * len(single_answer)
+        multiple_keys, multiple_cached = [None] * len(multiple_answer), [None] * len(multiple_answer)
+
+    # 各プロセス・スレッドからコピーせずに参照できるよう集計対象を共有する
+    frame_key = id(df_analysis)
+    _SHARED_SURVEY_FRAMES[frame_key] = (df_analysis, profiles)
+    try:
+        # 単一回答の処理（キャッシュにない質問のみ集計）
+        print("\n単一回答のクロス集計処理中...")
+        with metrics_stage('tabulate_single'):
+            computed = iter(map_questions(
+                tabulate_single_question,
+                [(frame_key, question, cube_mode)
+                 for question, cached in zip(single_answer, single_cached) if cached is None],
+                workers=workers, backend=backend
+            ))
+            single_tables = [next(computed) if cached is None else (cached['tables'], 0.0)
+                             for cached in single_cached]
+
+        # 複数回答の処理（キャッシュにない質問のみ集計）
+        print("\n複数回答のクロス集計処理中...")
+        with metrics_stage('tabulate_multiple'):
+            computed = iter(map_questions(
+                tabulate_multiple_question,
+                [(frame_key, question_group, question_cols)
+                 for (question_group, question_cols), cached in zip(multiple_answer.items(), multiple_cached)
+                 if cached is None],
+                workers=workers, backend=backend
+            ))
+            multiple_tables = [next(computed) if cached is None else (cached['tables'], 0.0)
+                               for cached in multiple_cached]
+    finally:
+        del _SHARED_SURVEY_FRAMES[frame_key]
+
+    for question, (tables, seconds), key, cached in zip(single_answer, single_tables, single_keys, single_cached):
+        log_item(f"  処理中: {question}" + (" (キャッシュ)" if cached is not None else ""))
+        if metrics is not None:
+            metrics.record_question(question, seconds, tables)
 
         # 質問タイトルを取得（元のdfから2行目を取得）
         question_title = get_question_title(df, question)
+        cached_blocks = cached['blocks'] if cached is not None else None
+        question_blocks = collect_question_tables(results, blocks, question_title, tables, cached_blocks)
+        if key and question_blocks != cached_blocks:
+            result_cache.put(key, {'tables': tables, 'blocks': question_blocks})
 
-        # 性別×回答
-        gender_crosstab = process_gender_crosstab(df_analysis, question)
-        if gender_crosstab is not None and not gender_crosstab.empty:
-            results[f"{question_title} (性別×回答)"] = gender_crosstab
-
-        # 年代×回答
-        age_crosstab = process_age_crosstab(df_analysis, question)
-        if age_crosstab is not None and not age_crosstab.empty:
-            results[f"{question_title} (年代×回答)"] = age_crosstab
-
-        # 性別×年代×回答
-        crosstab = process_single_answer_crosstab(df_analysis, question)
-        if crosstab is not None and not crosstab.empty:
-            results[f"{question_title} (性別×年代×回答)"] = crosstab
-
-    # 複数回答の処理
-    print("\n複数回答のクロス集計処理中...")
-    for question_group, question_cols in multiple_answer.items():
-        print(f"  処理中: {question_group}")
+    for (question_group, question_cols), (tables, seconds), key, cached in zip(
+            multiple_answer.items(), multiple_tables, multiple_keys, multiple_cached):
+        log_item(f"  処理中: {question_group}" + (" (キャッシュ)" if cached is not None else ""))
+        if metrics is not None:
+            metrics.record_question(question_group, seconds, tables)
 
         # 質問タイトルを取得（長い質問文を優先的に選択）
-        question_title = question_group  # デフォルト値
-        if question_cols:
-            # 長い質問文（数字でないもの）を探す
-            long_question_col = None
-            for col in question_cols:
-                parts = col.split('_')
-                if len(parts) >= 3 and not parts[2].isdigit():
-                    long_question_col = col
-                    break
-
-            # 長い質問文があればそれを使用、なければ最初の選択肢を使用
-            title_col = long_question_col if long_question_col else question_cols[0]
-            question_title = get_question_title(df, title_col)
-
-        # 性別×回答
-        gender_crosstab = process_multiple_answer_gender_crosstab(df_analysis, question_group, question_cols)
-        if gender_crosstab is not None and not gender_crosstab.empty:
-            results[f"{question_title} (性別×回答)"] = gender_crosstab
-
-        # 年代×回答
-        age_crosstab = process_multiple_answer_age_crosstab(df_analysis, question_group, question_cols)
-        if age_crosstab is not None and not age_crosstab.empty:
-            results[f"{question_title} (年代×回答)"] = age_crosstab
-
-        # 性別×年代×回答
-        crosstab = process_multiple_answer_crosstab(df_analysis, question_group, question_cols)
-        if crosstab is not None and not crosstab.empty:
-            results[f"{question_title} (性別×年代×回答)"] = crosstab
-
+        question_title = get_multiple_question_title(df, question_group, question_cols)
+        cached_blocks = cached['blocks'] if cached is not None else None
+        question_blocks = collect_question_tables(results, blocks, question_title, tables, cached_blocks)
+        if key and question_blocks != cached_blocks:
+            result_cache.put(key, {'tables': tables, 'blocks': question_blocks})
+
+    if result_cache is not None:
+        # 上限サイズを超えた分は全質問の保存後に1度だけ削除する
+        result_cache.evict()
+        result_cache.report()
+
+    # FA列の上位回答の集計表も質問番号順に並べて結果シートに追加する
+    results.update(fa_results)
+
+    if all_pairs:
+        # 全質問×全質問のクロス集計表を作成し、別のシート（ファイル）にまとめて保存する
+        print("\n質問間クロス集計処理中...")
+        with metrics_stage('tabulate_all_pairs'):
+            pair_results = tabulate_all_pairs(df, df_analysis, single_answer, multiple_answer, profiles)
+        if metrics is not None:
+            metrics.counts['pair_tables'] = len(pair_results)
+
+        pair_output_path = None
+        if output_path:
+            stem, extension = os.path.splitext(output_path)
+            pair_output_path = f"{stem}_質問間クロス集計{extension}"
+        save_survey_results(workbook, pair_results, update_in_place=update_in_place,
+                            output_path=pair_output_path, sheet_name="質問間クロス集計")
+
+    return save_survey_results(workbook, results, update_in_place=update_in_place, output_path=output_path,
+                               blocks=blocks)
+
+def save_survey_results(workbook, results, update_in_place=False, output_path=None, sheet_name="クロス集計結果",
+                        blocks=None):
+    """集計結果を質問番号順に並べてスプレッドシート（output_path指定時はファイル）に保存する"""
     # 結果をスプレッドシートに保存
-    print("\n結果をスプレッドシートに保存中...")
+    print("\n結果をスプレッドシートに保存中..." if not output_path else "\n結果をファイルに保存中...")
 
     # 結果を質問番号順にソート
     def get_question_sort_key(title):
@@ -580,30 +2062,130 @@ def run_survey_crosstab(spreadsheet_url, sheet_name):
         return (999, 999)  # 抽出できない場合は最後に配置
 
     # 質問番号順にソートした結果を作成
-    print("\n=== ソート前のタイトル一覧 ===")
+    log_item("\n=== ソート前のタイトル一覧 ===")
     for title in results.keys():
         sort_key = get_question_sort_key(title)
-        print(f"タイトル: {title}")
-        print(f"ソートキー: {sort_key}")
-        print("---")
+        log_item(f"タイトル: {title}")
+        log_item(f"ソートキー: {sort_key}")
+        log_item("---")
 
     sorted_results = dict(sorted(results.items(), key=lambda x: get_question_sort_key(x[0])))
 
-    print("\n=== ソート後のタイトル順序 ===")
+    log_item("\n=== ソート後のタイトル順序 ===")
     for i, title in enumerate(sorted_results.keys()):
-        print(f"{i+1}. {title}")
+        log_item(f"{i+1}. {title}")
+
+    metrics = current_metrics()
+    if metrics is not None and sheet_name == "クロス集計結果":
+        metrics.counts['tables'] = len(sorted_results)
 
-    create_summary_sheet(workbook, sorted_results)
+    if output_path:
+        with metrics_stage('serialize'):
+            values = build_summary_values(sorted_results, blocks)
+        with metrics_stage('write'):
+            write_values_file(output_path, values, sheet_name=sheet_name)
+    else:
+        create_summary_sheet(workbook, sorted_results, sheet_name_prefix=sheet_name, update_in_place=update_in_place,
+                             blocks=blocks)
 
     print("処理完了！")
     return results
 
+def parse_manifest_option(value):
+    """マニフェストのセル値を run_survey_crosstab の引数の型に変換する"""
+    if isinstance(value, str):
+        if value.lower() in ('true', 'false'):
+            return value.lower() == 'true'
+        if value.isdigit():
+            return int(value)
+    return value
+
+def load_manifest(manifest):
+    """マニフェスト（CSVパス・DataFrame・辞書のリスト）を1行1ブックの辞書リストに変換する"""
+    if isinstance(manifest, str):
+        manifest = pd.read_csv(manifest, dtype=str, keep_default_na=False)
+    if isinstance(manifest, pd.DataFrame):
+        manifest = manifest.to_dict('records')
+
+    option_names = set(inspect.signature(run_survey_crosstab).parameters) - {'spreadsheet_url', 'sheet_name', 'gc'}
+    entries = []
+    for row in manifest:
+        unknown = set(row) - option_names - {'spreadsheet_url', 'sheet_name'}
+        if unknown:
+            raise ValueError(f"マニフェストに不明な列があります: {sorted(unknown)}")
+        options = {key: parse_manifest_option(value) for key, value in row.items()
+                   if key in option_names and value != ''}
+        entries.append((row['spreadsheet_url'], row['sheet_name'], options))
+    return entries
+
+def run_survey_crosstab_batch(manifest, max_workers=4, summary_path=None):
+    """マニフェストに記載された複数のスプレッドシートを1つの認証済みクライアントで同時並行に集計する"""
+    entries = load_manifest(manifest)
+    gc = authenticate_google()
+
+    def run_entry(entry):
+        spreadsheet_url, sheet_name, options = entry
+        started = time.time()
+        try:
+            results = run_survey_crosstab(spreadsheet_url, sheet_name, gc=gc, **options)
+            return {'spreadsheet_url': spreadsheet_url, 'sheet_name': sheet_name, 'status': '成功',
+                    'tables': len(results), 'elapsed_sec': round(time.time() - started, 2), 'error': ''}
+        except Exception as e:
+            traceback.print_exc()
+            return {'spreadsheet_url': spreadsheet_url, 'sheet_name': sheet_name, 'status': '失敗',
+                    'tables': 0, 'elapsed_sec': round(time.time() - started, 2), 'error': f"{type(e).__name__}: {e}"}
+
+    # 通信待ちの間に他のブックの集計が進むよう、同時実行数を制限して並行処理する
+    with ThreadPoolExecutor(max_workers=max(1, max_workers)) as executor:
+        summary = pd.DataFrame(list(executor.map(run_entry, entries)))
+
+    print("\n=== バッチ処理結果 ===")
+    print(summary.to_string(index=False))
+    if summary_path:
+        summary.to_csv(summary_path, index=False)
+        print(f"処理結果を保存しました: {summary_path}")
+
+    return summary
+
 # ===========================================
 # 実行（変更不要）
 # ===========================================
-results = run_survey_crosstab(SPREADSHEET_URL, SHEET_NAME)
-
-# 結果の確認（オプション）
-for question, crosstab in results.items():
-    print(f"\n=== {question} ===")
-    print(crosstab)
+# Colabのセル・python fixed_column.py として実行した場合のみ実行する（importした場合は実行しない）
+if __name__ == '__main__':
+    configure_api_scheduler(user_per_minute=API_USER_QUOTA_PER_MINUTE, project_per_minute=API_PROJECT_QUOTA_PER_MINUTE)
+
+    if MANIFEST_PATH:
+        batch_summary = run_survey_crosstab_batch(MANIFEST_PATH, max_workers=BATCH_MAX_WORKERS, summary_path=BATCH_SUMMARY_PATH)
+        results = {}
+    else:
+        results = run_survey_crosstab(
+            SPREADSHEET_URL, SHEET_NAME,
+            cube_mode=USE_CUBE_MODE,
+            categorical=USE_CATEGORICAL_LOAD,
+            cache_dir=SNAPSHOT_CACHE_DIR,
+            refresh_cache=REFRESH_CACHE,
+            window_rows=READ_WINDOW_ROWS,
+            state_dir=INCREMENTAL_STATE_DIR,
+            workers=PARALLEL_WORKERS,
+            backend=PARALLEL_BACKEND,
+            quiet=QUIET_MODE,
+            report_path=RUN_REPORT_PATH,
+            fa_threshold=FA_THRESHOLD,
+            skip_fa_columns=SKIP_FA_COLUMNS,
+            update_in_place=UPDATE_IN_PLACE,
+            output_path=OUTPUT_PATH or None,
+            all_pairs=ALL_PAIRS_MODE,
+            planned_load=PLANNED_LOAD,
+            result_cache_dir=RESULT_CACHE_DIR or None,
+            result_cache_max_mb=RESULT_CACHE_MAX_MB,
+            fa_summary=FA_SUMMARY_MODE,
+            fa_summary_top_n=FA_SUMMARY_TOP_N,
+            fa_summary_capacity=FA_SUMMARY_CAPACITY,
+            engine=TABULATION_ENGINE
+        )
+
+    # 結果の確認（オプション）
+    if not QUIET_MODE:
+        for question, crosstab in results.items():
+            print(f"\n=== {question} ===")
+            print(crosstab)
@@ -0,0 +1,178 @@
+# ===========================================
+# column_order.py のテスト（オフライン実行用）
+# ===========================================
+# 使い方:
+#   python -m pytest crosstab/tests
+
+import pandas as pd
+import pytest
+
+from crosstab import column_order, fixed_column
+
+class FakeClock:
+    """時計と待機を差し替え、待った秒数を記録する"""
+
+    def __init__(self):
+        self.now = 0.0
+        self.sleeps = []
+
+    def __call__(self):
+        return self.now
+
+    def sleep(self, seconds):
+        self.sleeps.append(seconds)
+        self.now += seconds
+
+class FakeResponse:
+    def __init__(self, status_code):
+        self.status_code = status_code
+
+class FakeAPIError(Exception):
+    """gspread.exceptions.APIError と同様にレスポンスのステータスコードを持つ例外"""
+
+    def __init__(self, status_code):
+        super().__init__(f"APIError {status_code}")
+        self.response = FakeResponse(status_code)
+
+def failing_call(statuses, result='ok'):
+    """指定したステータスコードで順に失敗し、その後は result を返す関数と呼び出し回数のリストを返す"""
+    calls = []
+
+    def func():
+        calls.append(len(calls))
+        if len(calls) <= len(statuses):
+            raise FakeAPIError(statuses[len(calls) - 1])
+        return result
+    return func, calls
+
+@pytest.fixture
+def clock(monkeypatch):
+    # 再試行の待ち時間のゆらぎをなくして待機秒数を確認できるようにする
+    monkeypatch.setattr(fixed_column.random, 'uniform', lambda low, high: 0.0)
+    return FakeClock()
+
+def make_scheduler(clock, **kwargs):
+    return fixed_column.SheetsApiScheduler(clock=clock, sleep=clock.sleep, **kwargs)
+
+def test_api_calls_share_fixed_column_scheduler():
+    """column_order.py のAPI呼び出しが fixed_column.py と同じクォータ（スケジューラー）で数えられる"""
+    scheduler = fixed_column.configure_api_scheduler(user_per_minute=60, project_per_minute=300)
+    try:
+        column_order.call_api('get_all_values', lambda: [])
+        fixed_column.call_api('get_all_values', lambda: [])
+        assert column_order.get_api_scheduler() is scheduler
+        assert scheduler.stats['get_all_values']['calls'] == 2
+    finally:
+        fixed_column.configure_api_scheduler()
+
+def test_token_bucket_waits_for_refill(clock):
+    """1分あたりの上限までは待たず、超えた分はトークンが補充されるまで待つ"""
+    bucket = fixed_column.TokenBucket(60, clock=clock, sleep=clock.sleep)
+
+    assert [bucket.acquire() for _ in range(60)] == [0.0] * 60
+    assert bucket.acquire() == pytest.approx(1.0)
+    assert clock.sleeps == [pytest.approx(1.0)]
+
+@pytest.mark.parametrize('status', [429, 500, 503])
+def test_retries_quota_and_server_errors_with_backoff(clock, status):
+    """429・5xxは指数バックオフで再試行し、再試行回数と待った秒数を記録する"""
+    scheduler = make_scheduler(clock, base_delay=1.0)
+    func, calls = failing_call([status, status])
+
+    assert scheduler.call('batch_get', func) == 'ok'
+    assert len(calls) == 3
+    assert clock.sleeps == [1.0, 2.0]
+    assert scheduler.stats['batch_get']['calls'] == 1
+    assert scheduler.stats['batch_get']['retries'] == 2
+    assert scheduler.stats['batch_get']['wait_seconds'] == pytest.approx(3.0)
+
+def test_error_code_attribute_is_retried(clock):
+    """レスポンスを持たずステータスコードを code に持つ例外も再試行する"""
+    scheduler = make_scheduler(clock, base_delay=0.5)
+    error = Exception('rate limited')
+    error.code = 429
+    calls = []
+
+    def func():
+        calls.append(1)
+        if len(calls) == 1:
+            raise error
+        return 'ok'
+
+    assert scheduler.call('batch_get', func) == 'ok'
+    assert clock.sleeps == [0.5]
+
+@pytest.mark.parametrize('status', [400, 403, 404])
+def test_client_errors_are_raised_without_retry(clock, status):
+    """429以外の4xxは再試行せずにそのまま送出する"""
+    scheduler = make_scheduler(clock)
+    func, calls = failing_call([status])
+
+    with pytest.raises(FakeAPIError):
+        scheduler.call('update', func)
+    assert len(calls) == 1
+    assert clock.sleeps == []
+    assert scheduler.stats['update']['calls'] == 1
+    assert scheduler.stats['update']['retries'] == 0
+
+def test_raises_when_retries_run_out(clock):
+    """再試行の上限に達した場合は最後のエラーを送出する"""
+    scheduler = make_scheduler(clock, max_retries=2, base_delay=1.0)
+    func, calls = failing_call([500, 500, 500])
+
+    with pytest.raises(FakeAPIError):
+        scheduler.call('batch_get', func)
+    assert len(calls) == 3
+    assert clock.sleeps == [1.0, 2.0]
+    assert scheduler.stats['batch_get']['retries'] == 2
+
+def test_user_quota_limits_reads_and_writes_separately(clock):
+    """ユーザー単位の上限を超えた呼び出しは待機し、読み取りと書き込みは別々に数える"""
+    scheduler = make_scheduler(clock, user_per_minute=2, project_per_minute=300)
+
+    for _ in range(2):
+        scheduler.call('batch_get', lambda: None)
+        scheduler.call('update', lambda: None)
+    assert clock.sleeps == []
+
+    scheduler.call('batch_get', lambda: None)
+    assert clock.sleeps == [pytest.approx(30.0)]
+    assert scheduler.stats['batch_get']['wait_seconds'] == pytest.approx(30.0)
+    assert scheduler.stats['update']['wait_seconds'] == 0.0
+
+def reference_cross_tab(column_group1, column_group2, group1_unique, group2_unique):
+    """行ごと・選択肢の組み合わせごとに1件ずつ数える集計（行列積による集計の比較用）"""
+    cross_tab = pd.DataFrame(0, index=group1_unique, columns=group2_unique)
+    for i in range(len(column_group1)):
+        for item1 in column_group1.iloc[i].dropna():
+            for item2 in column_group2.iloc[i].dropna():
+                cross_tab.at[item1, item2] += 1
+    return cross_tab
+
+@pytest.mark.parametrize('threshold', [200, 0])
+def test_build_cross_tab_matches_reference_loop(monkeypatch, threshold):
+    """行列積（密行列・疎行列）による集計が、1件ずつ数える集計と一致する"""
+    monkeypatch.setattr(column_order, 'sparse_threshold', threshold)
+    column_group1 = pd.DataFrame([
+        ['りんご', 'りんご', None],   # 同じ選択肢の重複
+        ['その他', '', 'みかん'],     # 空文字も選択肢として数える
+        [None, None, None],           # 回答なしの行
+        ['みかん', 'その他', 'ぶどう'],
+    ])
+    column_group2 = pd.DataFrame([
+        ['はい', None],
+        ['いいえ', 'いいえ'],
+        ['はい', 'その他'],
+        ['', 'はい'],
+    ])
+    group1_unique = column_order.get_unique_choices(column_group1)
+    group2_unique = column_order.get_unique_choices(column_group2)
+    assert group1_unique[0] == 'その他' and group2_unique[0] == 'その他'
+
+    cross_tab = column_order.build_cross_tab(column_group1, column_group2, group1_unique, group2_unique)
+
+    pd.testing.assert_frame_equal(
+        cross_tab, reference_cross_tab(column_group1, column_group2, group1_unique, group2_unique),
+        check_dtype=False
+    )
+    assert cross_tab.at['りんご', 'はい'] == 2
@@ -0,0 +1,197 @@
+# ===========================================
+# fixed_column.py のテスト（オフライン実行用）
+# ===========================================
+# 合成したアンケートデータ（benchmark.generate_survey_values）をCSVファイルや
+# メモリ上の疑似ワークシートに載せ、集計方法の違いで集計表が変わらないことを確認します。
+#
+# 使い方:
+#   python -m pytest crosstab/tests
+
+import contextlib
+import csv
+import io
+import threading
+
+import pandas as pd
+import pytest
+
+from crosstab import benchmark, fixed_column
+
+@pytest.fixture(autouse=True)
+def unlimited_api_quota():
+    """疑似ワークシートへの呼び出しでクォータ待ちが発生しないようにする"""
+    fixed_column.configure_api_scheduler(user_per_minute=1_000_000, project_per_minute=1_000_000)
+    yield
+    fixed_column.configure_api_scheduler()
+
+def write_csv(path, values):
+    """全セル値をCSVファイルに書き出す"""
+    with open(path, 'w', newline='', encoding='utf-8') as f:
+        csv.writer(f).writerows(values)
+
+def run_quietly(func, *args, **kwargs):
+    """標準出力を抑制して実行する"""
+    with contextlib.redirect_stdout(io.StringIO()):
+        return func(*args, **kwargs)
+
+def assert_same_tables(expected, actual):
+    """集計結果（タイトル→集計表）が行・列の順序まで一致することを確認する"""
+    assert list(expected) == list(actual)
+    for title in expected:
+        pd.testing.assert_frame_equal(expected[title], actual[title], obj=title)
+
+@pytest.mark.parametrize('seed', [0, 1, 2])
+def test_incremental_matches_full_run(tmp_path, seed):
+    """前回の集計状態に追加行を加算した結果が、全行を集計した結果と一致する"""
+    respondents = 60
+    values = benchmark.generate_survey_values(respondents=respondents, single_questions=3, multi_questions=3,
+                                              genders=4, seed=seed)
+    csv_path = tmp_path / 'survey.csv'
+    write_csv(csv_path, values)
+    full = run_quietly(fixed_column.run_survey_crosstab, str(csv_path), '', output_path=str(tmp_path / 'full.csv'))
+
+    # 1回目は先頭の8割の行だけを集計し、2回目で残りの行を追加で集計する
+    worksheet = benchmark.InMemoryWorksheet('survey', [list(row) for row in values[:2 + respondents * 4 // 5]],
+                                            cols=len(values[0]))
+    workbook = benchmark.InMemoryWorkbook([worksheet])
+    state_dir = str(tmp_path / 'state')
+    run_quietly(fixed_column.tabulate_incremental, workbook, worksheet, state_dir)
+    worksheet.values = [list(row) for row in values]
+    worksheet.row_count = len(values)
+    incremental = run_quietly(fixed_column.tabulate_incremental, workbook, worksheet, state_dir)
+
+    assert_same_tables(full, incremental)
+
+@pytest.mark.parametrize('extension', ['.csv', '.parquet'])
+def test_duckdb_engine_matches_pandas(tmp_path, extension):
+    """DuckDBでの集計結果と書き出したファイルが、pandasでの集計と一致する"""
+    pytest.importorskip('duckdb')
+    values = benchmark.generate_survey_values(respondents=300, single_questions=6, multi_questions=4,
+                                              genders=4, seed=3)
+    path = tmp_path / f'survey{extension}'
+    if extension == '.csv':
+        write_csv(path, values)
+    else:
+        pd.DataFrame(values[1:], columns=values[0]).to_parquet(path, index=False)
+
+    results = {}
+    for engine in ('pandas', 'duckdb'):
+        results[engine] = run_quietly(fixed_column.run_survey_crosstab, str(path), '', engine=engine,
+                                      workers=4 if engine == 'duckdb' else 0,
+                                      output_path=str(tmp_path / f'{engine}.csv'))
+
+    assert_same_tables(results['pandas'], results['duckdb'])
+    assert (tmp_path / 'pandas.csv').read_bytes() == (tmp_path / 'duckdb.csv').read_bytes()
+
+def test_fa_summary_merges_answer_named_other():
+    """「その他」という回答が上位にあっても件数が失われず、合計が回答数と一致する"""
+    answers = ['その他'] * 20 + [f'回答{i % 5}' for i in range(20)] + [f'自由回答{i}' for i in range(20)]
+    df = pd.DataFrame({'gender': ['男性', '女性'] * 30, 'age_range': ['20代'] * 60, 'q_9': answers})
+
+    tables = fixed_column.summarize_fa_column(df, 'q_9', top_n=3)
+
+    for table in tables.values():
+        assert list(table.columns) == ['回答0', '回答1', '回答2', 'その他', 'All']
+        assert table.loc['All', 'All'] == 60
+        assert table.loc['All', 'その他'] == 60 - 12
+
+def test_quiet_mode_is_per_run(tmp_path, capsys):
+    """静音モードは実行中の集計（スレッド）だけに適用され、終了後は元に戻る"""
+    values = benchmark.generate_survey_values(respondents=50, single_questions=2, multi_questions=1, seed=0)
+    csv_path = tmp_path / 'survey.csv'
+    write_csv(csv_path, values)
+
+    other_thread_quiet = []
+    thread = threading.Thread(target=lambda: (fixed_column.set_quiet(True),
+                                              other_thread_quiet.append(fixed_column.is_quiet())))
+    thread.start()
+    thread.join()
+    assert other_thread_quiet == [True]
+    assert not fixed_column.is_quiet()
+
+    fixed_column.run_survey_crosstab(str(csv_path), '', quiet=True, workers=2,
+                                     output_path=str(tmp_path / 'out.csv'))
+    assert '処理中:' not in capsys.readouterr().out
+    assert not fixed_column.is_quiet()
+
+    fixed_column.log_item('進捗')
+    assert capsys.readouterr().out == '進捗\n'
+
+def test_all_pairs_dense_matches_sparse():
+    """質問間クロス集計の密行列（float32）と疎行列での結果が一致する"""
+    values = benchmark.generate_survey_values(respondents=400, single_questions=4, multi_questions=2, seed=4)
+    df = pd.DataFrame(values[1:], columns=values[0])
+    df_analysis = df.iloc[1:].reset_index(drop=True)
+    single_answer, multiple_answer = fixed_column.identify_question_columns(df_analysis)
+    question_cols = single_answer + [col for cols in multiple_answer.values() for col in cols]
+    profiles = fixed_column.profile_question_columns(df_analysis, question_cols)
+
+    dense = fixed_column.tabulate_all_pairs(df, df_analysis, single_answer, multiple_answer, profiles)
+    sparse = fixed_column.tabulate_all_pairs(df, df_analysis, single_answer, multiple_answer, profiles,
+                                             max_dense_cells=0)
+
+    assert dense
+    assert_same_tables(dense, sparse)
+    assert all((table.dtypes == 'int64').all() for table in dense.values())
+
+@pytest.mark.parametrize('options', [
+    {},
+    {'planned_load': True},
+    {'window_rows': 37},
+    {'planned_load': True, 'window_rows': 37, 'categorical': True},
+])
+def test_sheet_loads_match_file_input(tmp_path, options):
+    """スプレッドシートからの読み込み方（列の絞り込み・行の分割取得）によらず、ファイル入力と同じ集計表になる"""
+    values = benchmark.generate_survey_values(respondents=200, single_questions=6, multi_questions=3,
+                                              fa_share=0.2, seed=5)
+    csv_path = tmp_path / 'survey.csv'
+    write_csv(csv_path, values)
+    expected = run_quietly(fixed_column.run_survey_crosstab, str(csv_path), '',
+                           output_path=str(tmp_path / 'file.csv'))
+
+    workbook = benchmark.InMemoryWorkbook([benchmark.InMemoryWorksheet('survey', [list(row) for row in values])])
+    actual = run_quietly(fixed_column.run_survey_crosstab, 'https://docs.google.com/spreadsheets/d/test/edit',
+                         'survey', gc=benchmark.InMemoryClient(workbook), output_path=str(tmp_path / 'sheet.csv'),
+                         **options)
+
+    assert_same_tables(expected, actual)
+    assert (tmp_path / 'file.csv').read_bytes() == (tmp_path / 'sheet.csv').read_bytes()
+
+def test_windowed_load_stops_at_end_of_data():
+    """分割取得はデータの終わりで止まり、シートの空のグリッドを読み進めない"""
+    values = benchmark.generate_survey_values(respondents=202, single_questions=3, multi_questions=1, seed=6)
+    worksheet = benchmark.InMemoryWorksheet('survey', [list(row) for row in values], rows=5000)
+
+    df, df_analysis = run_quietly(fixed_column.load_survey_data_paged, worksheet, 100)
+
+    assert len(df_analysis) == 202
+    # タイトル行の取得1回 + 100行ずつの取得3回 + データがないことを確認する1回
+    assert worksheet.api_calls == 5
+
+def make_gender_table(yes, no):
+    """性別×回答の小さな集計表を作成する"""
+    return pd.DataFrame([[yes, no, yes + no], [1, 2, 3], [yes + 1, no + 2, yes + no + 3]],
+                        index=pd.Index(['男性', '女性', 'All'], name='gender'),
+                        columns=pd.Index(['はい', 'いいえ', 'All'], name='q_1'))
+
+def test_update_in_place_rewrites_only_changed_rows():
+    """既存シートの更新では変更のあった行範囲だけを送信し、削除された集計表の行は空になる"""
+    results = {'質問1': make_gender_table(3, 4), '質問2': make_gender_table(5, 6), '質問3': make_gender_table(7, 8)}
+    old_values = run_quietly(fixed_column.build_summary_values, results)
+    worksheet = benchmark.InMemoryWorksheet('クロス集計結果', rows=len(old_values), cols=len(old_values[0]))
+    run_quietly(fixed_column.write_values_chunked, worksheet, old_values)
+    assert worksheet.get_values() == old_values[:-2]
+
+    # 質問2の1セルを変更し、最後の質問3を削除する
+    results['質問2'] = make_gender_table(9, 6)
+    del results['質問3']
+    new_values = run_quietly(fixed_column.build_summary_values, results)
+    sent_ranges = []
+    batch_update = worksheet.batch_update
+    worksheet.batch_update = lambda data, **kwargs: (sent_ranges.append([item['range'] for item in data]),
+                                                     batch_update(data, **kwargs))
+    run_quietly(fixed_column.update_sheet_in_place, worksheet, new_values)
+
+    # 質問2の「男性」「All」の行と、質問3の空行以外の行を1回のbatch_updateで送信する
+    assert sent_ranges == [['A12:D12', 'A14:D14', 'A17:D17', 'A19:D22']]
+    assert worksheet.get_values() == new_values[:-2]